@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 数字人模块按 virtual_human 目录为根导入(wav2lip.audio、tts.resampler 等)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'virtual_human'))
@@ -0,0 +1,126 @@
+import threading
+
+import numpy as np
+
+from asr.audioring import AudioRing
+
+
+def drain(ring, chunk):
+    frames, types, _ = ring.read(ring.available() // chunk)
+    return frames.reshape(-1)
+
+
+def test_wraparound_keeps_sample_order():
+    chunk = 4
+    ring = AudioRing(8 * chunk, chunk)
+    rng = np.random.default_rng(0)
+    written, read = [], []
+    pos = 0
+    for _ in range(500):
+        n = int(rng.integers(1, 3 * chunk))
+        if ring.available() + n <= 8 * chunk:
+            samples = np.arange(pos, pos + n, dtype=np.float32)
+            ring.write(samples)
+            written.append(samples)
+            pos += n
+        k = int(rng.integers(0, 3))
+        if ring.frames_available() >= k:
+            frames, types, _ = ring.read(k)
+            assert not types.any()
+            read.append(frames.reshape(-1))
+    read.append(drain(ring, chunk))
+    written = np.concatenate(written)
+    read = np.concatenate(read)
+    assert np.array_equal(read, written[:len(read)])
+    assert len(written) - len(read) < chunk
+    # 容量没有被突破
+    assert ring._store[1] == 8 * chunk
+
+
+def test_growth_past_capacity_preserves_unread_samples():
+    chunk = 4
+    ring = AudioRing(4 * chunk, chunk)
+    ring.write(np.arange(12, dtype=np.float32))
+    ring.read(2)  # 读位置移到中间，之后的写入绕回缓冲开头
+    ring.write(np.arange(12, 20, dtype=np.float32))
+    ring.write(np.arange(20, 100, dtype=np.float32))  # 超出容量，扩容时搬移绕回的未读部分
+    assert ring._store[1] >= 92
+    assert np.array_equal(drain(ring, chunk), np.arange(8, 100, dtype=np.float32))
+
+
+def test_short_read_pads_with_silence():
+    ring = AudioRing(64, 4)
+    ring.write(np.ones(6, dtype=np.float32))
+    frames, types, _ = ring.read(3)
+    assert types.tolist() == [0, 0, 1]
+    assert frames.reshape(-1).tolist() == [1.] * 6 + [0.] * 6
+
+
+def test_clear_bumps_generation_and_drops_stale_writes():
+    ring = AudioRing(64, 4)
+    gen = ring.gen
+    ring.write(np.ones(8, dtype=np.float32), gen)
+    ring.clear()
+    assert ring.gen == gen + 1
+    assert ring.available() == 0
+    ring.write(np.ones(8, dtype=np.float32), gen)  # 打断前开始的写入被丢弃
+    assert ring.available() == 0
+    ring.write(np.full(8, 2, dtype=np.float32), ring.gen)
+    frames, types, read_gen = ring.read(2)
+    assert read_gen == gen + 1 and not types.any() and (frames == 2).all()
+    ring.clear(7)
+    assert ring.gen == 7 and ring.read(1)[2] == 7
+
+
+def test_trim_keeps_newest_samples_in_the_same_generation():
+    ring = AudioRing(16, 4)
+    gen = ring.gen
+    ring.write(np.arange(40, dtype=np.float32))
+    ring.trim(8)
+    assert ring.available() == 8 and ring.gen == gen
+    frames, types, read_gen = ring.read(2)
+    assert read_gen == gen and not types.any()
+    assert frames.reshape(-1).tolist() == list(range(32, 40))
+    ring.write(np.ones(4, dtype=np.float32))
+    ring.trim(8)  # 未超出时不动
+    assert ring.available() == 4
+
+
+def test_concurrent_producers_lose_and_duplicate_nothing():
+    chunk, producers, per_producer = 32, 4, 50000
+    ring = AudioRing(4 * chunk, chunk)
+    done = threading.Event()
+    out = []
+
+    def produce(p):
+        rng = np.random.default_rng(p)
+        # 每个生产者写入 p*1e6 + 1.. 的递增序列，float32 可精确表示
+        seq = np.arange(1, per_producer + 1, dtype=np.float32) + p * 1000000
+        i = 0
+        while i < len(seq):
+            n = int(rng.integers(1, 200))
+            ring.write(seq[i:i + n])
+            i += n
+
+    def consume():
+        while not done.is_set() or ring.available():
+            frames, _, _ = ring.read(4, timeout=0.01)
+            out.append(frames.reshape(-1))
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    threads = [threading.Thread(target=produce, args=(p,)) for p in range(producers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    done.set()
+    consumer.join()
+
+    samples = np.concatenate(out)
+    samples = samples[samples != 0]  # 去掉补齐的静音
+    assert len(samples) == producers * per_producer
+    for p in range(producers):
+        mine = samples[(samples > p * 1000000) & (samples < (p + 1) * 1000000)]
+        # 每个生产者的采样不丢不重且保持顺序
+        assert np.array_equal(mine, np.arange(1, per_producer + 1, dtype=np.float32) + p * 1000000)
@@ -0,0 +1,60 @@
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+
+from wav2lip.avatarpack import build_avatar_pack, open_avatar_pack
+
+
+@pytest.fixture
+def avatar(tmp_path):
+    rng = np.random.default_rng(0)
+    for name, shape in (('full_imgs', (48, 64, 3)), ('face_imgs', (16, 16, 3))):
+        os.makedirs(tmp_path / name)
+        for i in range(3):
+            cv2.imwrite(str(tmp_path / name / f'{i:08d}.png'), rng.integers(0, 256, shape, dtype=np.uint8))
+    with open(tmp_path / 'coords.pkl', 'wb') as f:
+        pickle.dump([(0, 16, 0, 16)] * 3, f)
+    return str(tmp_path)
+
+
+def test_pack_round_trip(avatar):
+    assert open_avatar_pack(avatar) is None
+    build_avatar_pack(avatar)
+    pack = open_avatar_pack(avatar)
+    assert len(pack) == 3 and pack.header['sources']['full_imgs']['count'] == 3
+    assert np.array_equal(pack.face_frames[1], cv2.imread(os.path.join(avatar, 'face_imgs', '00000001.png')))
+    assert pack.coords.tolist() == [[0, 16, 0, 16]] * 3
+
+
+@pytest.mark.parametrize('change', ['coords', 'frame', 'extra_frame'])
+def test_stale_pack_is_not_served(avatar, change):
+    build_avatar_pack(avatar)
+    if change == 'coords':
+        with open(os.path.join(avatar, 'coords.pkl'), 'wb') as f:
+            pickle.dump([(8, 24, 0, 16)] * 3, f)
+    elif change == 'frame':
+        path = os.path.join(avatar, 'face_imgs', '00000002.png')
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    else:
+        for name in ('full_imgs', 'face_imgs'):
+            shutil.copy(os.path.join(avatar, name, '00000002.png'), os.path.join(avatar, name, '00000003.png'))
+    assert open_avatar_pack(avatar) is None
+    if change == 'extra_frame':
+        with open(os.path.join(avatar, 'coords.pkl'), 'wb') as f:
+            pickle.dump([(0, 16, 0, 16)] * 4, f)
+    build_avatar_pack(avatar)
+    assert open_avatar_pack(avatar) is not None
+
+
+def test_pack_only_avatar(avatar):
+    build_avatar_pack(avatar)
+    for name in ('full_imgs', 'face_imgs'):
+        shutil.rmtree(os.path.join(avatar, name))
+    os.remove(os.path.join(avatar, 'coords.pkl'))
+    assert len(open_avatar_pack(avatar)) == 3
@@ -0,0 +1,75 @@
+import socket
+import threading
+from types import SimpleNamespace
+
+from tts.cancel import CancelToken, abort_response
+
+
+def test_callbacks_fire_once_on_cancel():
+    token = CancelToken()
+    calls = []
+    token.on_cancel(lambda: calls.append('a'))
+    token.on_cancel(lambda: calls.append('b'))
+    assert not token.cancelled and calls == []
+    token.cancel()
+    token.cancel()
+    assert token.cancelled and token.cancelled_at is not None
+    assert calls == ['a', 'b']
+
+
+def test_on_cancel_after_cancel_runs_immediately():
+    token = CancelToken()
+    token.cancel()
+    calls = []
+    token.on_cancel(lambda: calls.append(1))
+    assert calls == [1]
+
+
+def test_forget_drops_registered_callbacks():
+    token = CancelToken()
+    calls = []
+    token.on_cancel(lambda: calls.append(1))
+    token.forget()
+    token.cancel()
+    assert calls == []
+
+
+def test_failing_callback_does_not_stop_the_others():
+    token = CancelToken()
+    calls = []
+    token.on_cancel(lambda: 1 / 0)
+    token.on_cancel(lambda: calls.append(1))
+    token.cancel()
+    assert calls == [1]
+
+
+class FakeResponse:
+    def __init__(self, raw=None):
+        self.closed = False
+        if raw is not None:
+            self.raw = raw
+
+    def close(self):
+        self.closed = True
+
+
+def test_abort_response_unblocks_a_pending_read():
+    a, b = socket.socketpair()
+    try:
+        res = FakeResponse(SimpleNamespace(_connection=SimpleNamespace(sock=a)))
+        got = []
+        reader = threading.Thread(target=lambda: got.append(a.recv(1024)))
+        reader.start()
+        abort_response(res)
+        reader.join(2)
+        assert not reader.is_alive() and got == [b'']
+        assert res.closed
+    finally:
+        a.close()
+        b.close()
+
+
+def test_abort_response_falls_back_to_close():
+    for res in (FakeResponse(), FakeResponse(SimpleNamespace()), FakeResponse(SimpleNamespace(_connection=None))):
+        abort_response(res)
+        assert res.closed
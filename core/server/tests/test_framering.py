@@ -0,0 +1,64 @@
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from framering import FrameRing
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(3, (4, 4, 3))
+    yield ring
+    ring.close()
+
+
+def test_acquire_and_release(ring):
+    slots = [ring.write(np.full((4, 4, 3), i, dtype=np.uint8)) for i in range(3)]
+    assert sorted(slots) == [0, 1, 2]
+    for i, slot in enumerate(slots):
+        assert (ring.view(slot, (4, 4, 3)) == i).all()
+    # 不按写入顺序释放，释放的槽位被重新使用
+    ring.release(slots[1])
+    slot = ring.write(np.full((2, 2, 3), 9.7), timeout=1)
+    assert slot == slots[1]
+    assert (ring.view(slot, (2, 2, 3)) == 9).all()  # float 按 astype(uint8) 截断
+
+
+def test_write_blocks_until_a_slot_is_released(ring):
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+    slots = [ring.write(frame) for _ in range(3)]
+    t = time.perf_counter()
+    assert ring.write(frame, timeout=0.1) is None
+    assert time.perf_counter() - t >= 0.1
+    threading.Timer(0.1, ring.release, args=(slots[2],)).start()
+    assert ring.write(frame, timeout=2) == slots[2]
+
+
+def test_fits(ring):
+    assert ring.fits((4, 4, 3)) and ring.fits((2, 3, 3))
+    assert not ring.fits((5, 4, 3)) and not ring.fits((4, 4))
+
+
+def test_only_the_owner_unlinks(ring):
+    # spawn 的子进程拿到反序列化的副本，fork 的子进程继承创建者的副本，两种都不是 owner
+    assert ring.__getstate__()['_owner'] is None
+    # 子进程写入一帧后关闭，不能删除共享内存
+    for target, args in ((ring.write, (np.full((4, 4, 3), 5, dtype=np.uint8),)), (ring.close, ())):
+        p = mp.Process(target=target, args=args)
+        p.start()
+        p.join(30)
+        assert p.exitcode == 0
+    assert not ring.closed
+    assert (ring.view(0, (4, 4, 3)) == 5).all()
+    assert ring.write(np.zeros((4, 4, 3), dtype=np.uint8), timeout=1) == 1
+    shared_memory.SharedMemory(name=ring.shm.name).close()  # 仍然存在
+
+    name = ring.shm.name
+    ring.close()
+    assert ring.closed
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
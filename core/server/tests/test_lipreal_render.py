@@ -0,0 +1,176 @@
+import asyncio
+import queue
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+lipreal = pytest.importorskip('lipreal')
+from metrics import StageMetrics
+from asr.audioring import AudioRing
+
+
+class FakeASR:
+    """每步产出一个batch的静音结果(推理侧对静音batch直接放行)。"""
+
+    def __init__(self, out, batch_size):
+        self.out = out
+        self.batch_size = batch_size
+        self.steps = 0
+        self.sample_rate = 16000
+        self.ring = AudioRing(self.sample_rate, 320)
+
+    def run_step(self):
+        self.steps += 1
+        for _ in range(self.batch_size):
+            self.out.put((None, 0, (np.zeros((2, 320), np.float32), np.ones(2, np.int8)), 0, 0))
+
+
+class CountingCompositor:
+    def __init__(self):
+        self.count = 0
+
+    def compose(self, base_frame, res_frame=None, bbox=None):
+        self.count += 1
+        return base_frame
+
+
+class FakeTrack:
+    def __init__(self):
+        self._queue = queue.Queue()
+        self.frames = 0
+
+    async def put_frame(self, frame, epoch=0):
+        self.frames += 1
+
+
+def make_session():
+    real = object.__new__(lipreal.LipReal)
+    real.batch_size, real.fps = 4, 50
+    real.res_frame_queue = queue.Queue()
+    real.asr = FakeASR(real.res_frame_queue, real.batch_size)
+    real.tts = SimpleNamespace(render=lambda quit_event: None)
+    real.compositor = CountingCompositor()
+    real.frame_ring = SimpleNamespace(closed=False, close=lambda: None, release=lambda slot: None)
+    real.metrics = StageMetrics()
+    real.epoch = SimpleNamespace(value=0)
+    real.interrupted = None
+    real.avatar_gen = 0
+    real.frame_list_cycle = [np.zeros((8, 8, 3), np.uint8)]
+    real.coord_list_cycle = [(0, 4, 0, 4)]
+    real.render_event = threading.Event()
+    real.tracks_event = threading.Event()
+    real.idle_backlog = 0.5
+    real.render_lock = threading.Lock()
+    real.render_quit = None
+    real.loop = real.audio_track = real.video_track = None
+    return real
+
+
+def wait_for(cond, timeout=3.):
+    end = time.perf_counter() + timeout
+    while not cond() and time.perf_counter() < end:
+        time.sleep(0.01)
+    return cond()
+
+
+def test_no_composites_without_tracks():
+    real = make_session()
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    quit_event = threading.Event()
+    owner = threading.Thread(target=real.render, args=(quit_event,))
+    owner.start()
+    try:
+        # 没有轨道: 不步进ASR、不通知推理、不合成，推流进来的音频只保留最近 idle_backlog 秒
+        real.asr.ring.write(np.zeros(16000 * 5, np.float32))
+        time.sleep(0.5)
+        assert real.asr.steps == 0 and real.compositor.count == 0
+        assert not real.render_event.is_set()
+        assert real.asr.ring.available() <= 16000 * real.idle_backlog
+
+        # 连接挂上轨道后开始出帧
+        video, audio = FakeTrack(), FakeTrack()
+        conn_quit = threading.Event()
+        conn = threading.Thread(target=real.render, args=(conn_quit, loop, audio, video))
+        conn.start()
+        assert wait_for(lambda: video.frames > 0 and audio.frames > 0)
+        assert real.render_event.is_set()
+
+        # 连接断开后不再合成
+        conn_quit.set()
+        conn.join()
+        assert wait_for(lambda: not real.render_event.is_set())
+        time.sleep(0.2)
+        steps, count = real.asr.steps, real.compositor.count
+        time.sleep(1.)
+        assert (real.asr.steps, real.compositor.count) == (steps, count)
+    finally:
+        quit_event.set()
+        owner.join()
+        loop.call_soon_threadsafe(loop.stop)
+
+
+def test_leftover_frames_without_consumer_are_not_composited():
+    real = make_session()
+    released = []
+    real.frame_ring.release = released.append
+    real.frame_ring.view = lambda slot, shape: np.zeros(shape, np.uint8)
+    real.res_frame_queue.put(((3, (4, 4, 3)), 0, (np.zeros((2, 320), np.float32), np.zeros(2, np.int8)), 0, 0))
+    quit_event = threading.Event()
+    t = threading.Thread(target=real.process_frames, args=(quit_event,))
+    t.start()
+    assert wait_for(lambda: released == [3])
+    quit_event.set()
+    t.join()
+    assert real.compositor.count == 0
+
+
+def test_stale_frames_are_silenced_and_restamped():
+    real = make_session()
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    real.loop, real.audio_track, real.video_track = loop, FakeTrack(), FakeTrack()
+    stamped = []
+
+    async def put_frame(frame, epoch=0):
+        stamped.append((frame, epoch))
+    real.audio_track.put_frame = put_frame
+    real.epoch.value = 1
+    # 打断前(代号0)推理出的语音帧: 口型和声音都丢弃，按静音和当前代号送出
+    pcm = np.ones((2, 320), np.float32)
+    real.res_frame_queue.put((np.ones((4, 4, 3)), 0, (pcm, np.zeros(2, np.int8)), 0, 0))
+    composed = []
+    real.compositor.compose = lambda base, res=None, bbox=None: composed.append(res) or base
+    quit_event = threading.Event()
+    t = threading.Thread(target=real.process_frames, args=(quit_event,))
+    t.start()
+    try:
+        assert wait_for(lambda: len(stamped) == 2)
+    finally:
+        quit_event.set()
+        t.join()
+        loop.call_soon_threadsafe(loop.stop)
+    assert composed == [None]
+    assert [epoch for _, epoch in stamped] == [1, 1]
+    assert all(not frame.to_ndarray().any() for frame, _ in stamped)
+
+
+def test_interrupt_is_measured_when_the_track_sends_the_new_epoch():
+    real = make_session()
+    real.tts = SimpleNamespace(pause_talk=lambda: None)
+    real.asr.pause_talk = lambda gen=None: None
+    real.epoch = lipreal.mp.Value('i', 0)
+    real.audio_track = FakeTrack()
+    real.pause_talk()
+    assert real.interrupted[1] == 1
+    real.frame_sent(0)  # 打断前入队、已在发送的帧不算
+    assert real.metrics.histogram('interrupt')[2] == 0
+    time.sleep(0.05)
+    real.frame_sent(1)
+    real.frame_sent(1)
+    _, total, count = real.metrics.histogram('interrupt')
+    assert count == 1 and total >= 0.05
+    assert real.interrupted is None
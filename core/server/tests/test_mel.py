@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('librosa')
+
+from wav2lip import audio
+from wav2lip.audio import MEL_TOLERANCE, MelEngine, _librosa_melspectrogram
+
+
+@pytest.fixture(scope='module')
+def batch():
+    # 4 个会话，每个一个 LipASR 窗口的长度
+    rng = np.random.default_rng(0)
+    return (rng.standard_normal((4, 52 * 320)) * 0.3).astype(np.float32)
+
+
+def test_melspectrogram_matches_librosa(batch):
+    for wav in batch:
+        diff = np.abs(audio.melspectrogram(wav) - _librosa_melspectrogram(wav)).max()
+        assert diff <= MEL_TOLERANCE['numpy']
+
+
+@pytest.mark.parametrize('backend', ['numpy', 'torch'])
+def test_mel_engine_batch_matches_librosa(batch, backend):
+    if backend == 'torch':
+        pytest.importorskip('torch')
+    expected = np.stack([_librosa_melspectrogram(wav) for wav in batch])
+    out = MelEngine(backend).mel(batch)
+    assert out.shape == expected.shape
+    assert np.abs(out - expected).max() <= MEL_TOLERANCE[backend]
@@ -0,0 +1,53 @@
+import copy
+
+import pytest
+
+torch = pytest.importorskip('torch')
+from torch import nn
+
+from wav2lip.models import Wav2Lip, fuse_conv_bn, optimize_for_inference
+
+
+def _randomize_bn(model, generator):
+    # 随机权重下 BN 的统计量是 0/1，折叠后看不出差别，先换成非平凡的值
+    for m in model.modules():
+        if isinstance(m, nn.BatchNorm2d):
+            n = m.num_features
+            m.running_mean.copy_(torch.randn(n, generator=generator) * 0.1)
+            m.running_var.copy_(torch.rand(n, generator=generator) + 0.5)
+            m.weight.data.copy_(torch.rand(n, generator=generator) + 0.5)
+            m.bias.data.copy_(torch.randn(n, generator=generator) * 0.1)
+
+
+@pytest.fixture(scope='module')
+def reference():
+    torch.manual_seed(0)
+    model = Wav2Lip().eval()
+    with torch.no_grad():
+        _randomize_bn(model, torch.Generator().manual_seed(0))
+    return model
+
+
+@pytest.mark.parametrize('channels_last', [False, True])
+def test_fused_model_matches_reference(reference, channels_last):
+    mel = torch.randn(2, 1, 80, 16)
+    img = torch.rand(2, 6, 256, 256)
+    model = optimize_for_inference(copy.deepcopy(reference), channels_last)
+    assert not any(isinstance(m, nn.BatchNorm2d) for m in model.modules())
+    face = img.contiguous(memory_format=torch.channels_last) if channels_last else img
+    with torch.no_grad():
+        expected = reference(mel, img)
+        out = model(mel, face)
+    assert (out - expected).abs().max().item() < 1e-4
+
+
+def test_fuse_conv_bn_keeps_state_dict_keys(reference):
+    model = copy.deepcopy(reference)
+    conv_keys = {k for k in model.state_dict() if '.conv_block.0.' in k}
+    assert fuse_conv_bn(model) > 0
+    assert conv_keys <= set(model.state_dict())
+
+
+def test_fuse_conv_bn_needs_eval_mode():
+    with pytest.raises(RuntimeError):
+        fuse_conv_bn(Wav2Lip().train())
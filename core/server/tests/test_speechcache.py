@@ -0,0 +1,88 @@
+import os
+import time
+
+import numpy as np
+
+from tts.speechcache import SpeechCache, cache_stats, normalize_text, speech_cache, voice_id
+
+CLIP = 16000 * 4  # 1 秒 float32 的字节数
+
+
+def clip(seed):
+    return np.random.default_rng(seed).standard_normal(16000).astype(np.float32)
+
+
+def age(cache, keys):
+    # 按给定顺序把文件的最近使用时间设到过去(依次递增)，不依赖文件系统时间戳精度
+    now = time.time()
+    for i, key in enumerate(keys):
+        os.utime(cache._path(key), (now - 100 + i, now - 100 + i))
+
+
+def test_normalized_text_shares_a_key():
+    voice = voice_id('zh-CN-XiaoxiaoNeural')
+    key = SpeechCache.key('EdgeTTS', voice, '第2句。')
+    assert normalize_text(' 第２句。\n') == '第2句。'
+    assert SpeechCache.key('EdgeTTS', voice, ' 第２句。 ') == key
+    assert SpeechCache.key('XTTS', voice, '第2句。') != key
+    assert SpeechCache.key('EdgeTTS', voice_id('zh-CN-YunxiNeural'), '第2句。') != key
+
+
+def test_voice_id_follows_the_reference_file(tmp_path):
+    ref = tmp_path / 'ref.wav'
+    ref.write_bytes(b'a')
+    before = voice_id(str(ref), 'text')
+    ref.write_bytes(b'bb')
+    assert voice_id(str(ref), 'text') != before
+
+
+def test_round_trip_and_stats(tmp_path):
+    cache = SpeechCache(str(tmp_path))
+    key = SpeechCache.key('EdgeTTS', 'v', 'hello')
+    assert cache.get(key) is None
+    cache.put(key, clip(0))
+    got = cache.get(key)
+    assert isinstance(got, np.memmap) and np.array_equal(got, clip(0))
+    assert cache.get(key) is got  # 第二次从内存 LRU 取
+    assert cache.stats() == {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3, 'items': 1}
+
+
+def test_byte_cap_evicts_least_recently_used(tmp_path):
+    cache = SpeechCache(str(tmp_path), max_bytes=3 * CLIP + 4096)
+    keys = [SpeechCache.key('EdgeTTS', 'v', f'第{i}句。') for i in range(4)]
+    for i in range(3):
+        cache.put(keys[i], clip(i))
+    age(cache, keys[:3])
+    cache.get(keys[0])  # 最旧的一条刚被用过，不应被淘汰
+    cache.put(keys[3], clip(3))
+    assert not os.path.exists(cache._path(keys[1]))
+    for i in (0, 2, 3):
+        assert np.array_equal(cache.get(keys[i]), clip(i))
+    assert sum(e.stat().st_size for e in os.scandir(tmp_path)) <= cache.max_bytes
+
+
+def test_oversized_and_empty_clips_are_not_stored(tmp_path):
+    cache = SpeechCache(str(tmp_path), max_bytes=CLIP // 2)
+    cache.put('big', clip(0))
+    cache.put('empty', np.zeros(0, dtype=np.float32))
+    assert os.listdir(tmp_path) == []
+
+
+def test_memory_lru_keeps_most_recent_items(tmp_path):
+    cache = SpeechCache(str(tmp_path), max_items=2)
+    for k in 'abc':
+        cache.put(k, clip(ord(k)))
+        cache.get(k)
+    assert list(cache.lru) == ['b', 'c']
+    cache.get('b')
+    assert list(cache.lru) == ['c', 'b']
+    cache.get('a')  # 从磁盘重新映射，挤掉最久未用的 c
+    assert list(cache.lru) == ['b', 'a']
+
+
+def test_one_cache_per_directory(tmp_path):
+    root = str(tmp_path / 'shared')
+    cache = speech_cache(root)
+    assert speech_cache(root) is cache
+    cache.get('missing')
+    assert cache_stats()[root]['misses'] == 1
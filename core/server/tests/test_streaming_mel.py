@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip('librosa')
+
+from wav2lip import audio
+from wav2lip.audio import StreamingMel
+
+
+@pytest.mark.parametrize('length,chunk', [(16640, 320), (52 * 320 + 17, 10240), (50000, 333), (801, 320)])
+def test_streaming_mel_bit_identical(length, chunk):
+    wav = (np.random.default_rng(length).standard_normal(length) * 0.3).astype(np.float32)
+    expected = audio.melspectrogram(wav)
+    stream = StreamingMel()
+    streamed = np.concatenate([stream.push(wav[i:i + chunk]) for i in range(0, length, chunk)], axis=1)
+    # 推送过程中产出的帧已是最终结果，flush 只补上依赖尾部补零的帧
+    assert np.array_equal(streamed, expected[:, :streamed.shape[1]])
+    assert np.array_equal(np.concatenate((streamed, stream.flush()), axis=1), expected)
+
+
+def test_lipasr_mel_blocks_match_whole_stream():
+    pytest.importorskip('torch')
+    from asr.lipasr import LipASR
+
+    opt = SimpleNamespace(fps=50, batch_size=16, l=10, r=10)
+    asr = LipASR(opt)
+    steps = 5
+    frames = opt.l + opt.r + steps * opt.batch_size * 2
+    pcm = (np.random.default_rng(0).standard_normal(frames * asr.chunk) * 0.3).astype(np.float32)
+    asr.put_audio_block(pcm)
+    asr.warm_up()
+    blocks = []
+    for _ in range(steps):
+        asr.run_step()
+        blocks.append(asr.feat_queue.get(timeout=1)[0])
+    blocks = np.concatenate(blocks)
+
+    # 第 j 个视频帧的mel块从整条流的第 l*80/50 + j*80*2/fps 帧开始
+    mel = audio.melspectrogram(pcm)
+    starts = (opt.l * 80 / 50 + np.arange(len(blocks)) * 80. * 2 / opt.fps).astype(np.int64)
+    expected = np.stack([mel[:, s:s + 16] for s in starts]).astype(np.float32)
+    assert len(blocks) == steps * opt.batch_size
+    assert np.array_equal(blocks, expected)
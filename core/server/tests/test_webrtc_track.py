@@ -0,0 +1,34 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip('aiortc')
+from av import AudioFrame
+
+from webrtc.webrtc import PlayerStreamTrack
+
+
+def audio_frame(value):
+    frame = AudioFrame.from_ndarray(np.full((1, 320), value, dtype=np.int16), layout='mono', format='s16')
+    frame.sample_rate = 16000
+    return frame
+
+
+def test_recv_drops_frames_from_before_the_interrupt():
+    epoch = SimpleNamespace(value=0)
+    sent = []
+    player = SimpleNamespace(_start=lambda track: None, _stop=lambda track: None)
+    track = PlayerStreamTrack(player, 'audio', epoch=epoch, on_frame=sent.append)
+
+    async def run():
+        for value in (1, 2, 3):
+            await track.put_frame(audio_frame(value), 0)
+        epoch.value = 1  # 打断: 已入队的旧帧作废
+        await track.put_frame(audio_frame(0), 1)
+        await track.put_frame(audio_frame(4), 1)
+        return [int((await track.recv()).to_ndarray()[0, 0]) for _ in range(2)]
+
+    assert asyncio.run(run()) == [0, 4]
+    assert sent == [1, 1]
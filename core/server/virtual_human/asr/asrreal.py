@@ -61,15 +61,8 @@ class ASR(BaseASR):
         self.warm_up_steps = self.context_size + self.stride_left_size + self.stride_right_size #+ self.stride_left_size   #+ 8 + 2 * 3
 
     def get_audio_frame(self):         
-        try:
-            frame = self.queue.get(block=False)
-            type = 0
-            #print(f'[INFO] get frame {frame.shape}')
-        except queue.Empty:
-            frame = np.zeros(self.chunk, dtype=np.float32)
-            type = 1
-
-        return frame,type
+        frames, types, _ = self.ring.read(1) # 不等待，缺帧补静音
+        return frames[0], int(types[0])
 
     def get_next_feat(self): #get audio embedding to nerf
         # return a [1/8, 16] window, for the next input to nerf side.
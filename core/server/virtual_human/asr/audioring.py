@@ -0,0 +1,125 @@
+import threading
+import time
+
+import numpy as np
+
+
+class AudioRing:
+    """
+    多生产者/单消费者的 float32 音频环形缓冲，替代逐帧 ndarray 进出 queue.Queue。
+    写端(TTS 播放线程、/audio_stream_in、websocket 推流线程等，可能同时写)批量 write 任意长度的采样且从不长时间阻塞，空间不足时扩容；
+    读端(render 循环)一次 read 一整批帧，不足的帧补静音并在掩码里标出。
+    索引为单调递增的绝对采样号；写入、清空、扩容和读出时的索引更新与拷贝都在同一把锁内完成(每次只拷贝一批数据)，
+    等待数据时不持锁。
+    缓冲带一个代号: clear() 在锁内清空并推进代号，带旧代号的 write 直接丢弃，read 返回数据所属的代号，
+    打断前后的音频不会混在一起。
+    """
+
+    def __init__(self, capacity, chunk):
+        self.chunk = chunk
+        capacity = max(int(capacity), chunk)
+        self._store = (np.zeros(capacity, dtype=np.float32), capacity)
+        self._w = 0  # 已写入的采样总数，仅写端修改
+        self._r = 0  # 已读出的采样总数，仅读端修改
+        self._discard = 0  # clear() 请求丢弃到的位置，由读端生效
+        self._gen = 0  # 缓冲代号，每次 clear() 推进
+        self._lock = threading.Lock()
+        self._data = threading.Event()
+
+    def available(self):
+        return self._w - max(self._r, self._discard)
+
+    def frames_available(self):
+        return self.available() // self.chunk
+
+    @property
+    def gen(self):
+        return self._gen
+
+    def write(self, samples, gen=None):
+        """写入采样；gen 不为 None 且不是当前代号(写入前已被打断)时丢弃。"""
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        n = len(samples)
+        if n == 0:
+            return
+        with self._lock:
+            if gen is not None and gen != self._gen:
+                return
+            buf, cap = self._store
+            w = self._w
+            r = max(self._r, self._discard)
+            if w - r + n > cap:
+                buf, cap = self._grow(buf, cap, r, w, w - r + n)
+            start = w % cap
+            first = min(n, cap - start)
+            buf[start:start + first] = samples[:first]
+            if first < n:
+                buf[:n - first] = samples[first:]
+            self._w = w + n
+        self._data.set()
+
+    def _grow(self, buf, cap, r, w, need):
+        # 调用方持有 _lock
+        new_cap = cap
+        while new_cap < need:
+            new_cap *= 2
+        new_buf = np.zeros(new_cap, dtype=np.float32)
+        # 未读部分按绝对采样号搬到新缓冲
+        for i in range(r, w, cap):
+            n = min(cap, w - i)
+            src = self._take(buf, cap, i, n)
+            dst = i % new_cap
+            first = min(n, new_cap - dst)
+            new_buf[dst:dst + first] = src[:first]
+            new_buf[:n - first] = src[first:]
+        self._store = (new_buf, new_cap)
+        return new_buf, new_cap
+
+    @staticmethod
+    def _take(buf, cap, pos, n):
+        start = pos % cap
+        if start + n <= cap:
+            return buf[start:start + n]
+        return np.concatenate((buf[start:], buf[:n - (cap - start)]))
+
+    def read(self, n_frames, timeout=0.):
+        """
+        读出 n_frames 帧，返回 ((n_frames, chunk) float32, (n_frames,) int 类型, 代号)，类型 0 为语音、1 为补齐的静音。
+        缓冲不足时最多等 timeout 秒(整批一次)；仍不足则把残留的不满一帧的采样补零作为最后一帧语音，其余补静音。
+        """
+        need = n_frames * self.chunk
+        if timeout > 0 and self.available() < need:
+            deadline = time.perf_counter() + timeout
+            while self.available() < need:
+                self._data.clear()
+                if self.available() >= need:
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not self._data.wait(remaining):
+                    break
+        frames = np.zeros((n_frames, self.chunk), dtype=np.float32)
+        types = np.ones(n_frames, dtype=np.int64)
+        with self._lock:
+            if self._discard > self._r:
+                self._r = self._discard
+            buf, cap = self._store
+            r = self._r
+            n = min(self._w - r, need)
+            if n > 0:
+                frames.reshape(-1)[:n] = self._take(buf, cap, r, n)
+                types[:-(-n // self.chunk)] = 0
+                self._r = r + n
+            gen = self._gen
+        return frames, types, gen
+
+    def trim(self, keep):
+        """只保留最新的 keep 个采样，更早的未读音频丢弃(不推进代号)。没有读端消费时(空闲会话)用来限制积压。"""
+        with self._lock:
+            if self._w - max(self._r, self._discard) > keep:
+                self._discard = self._w - int(keep)
+
+    def clear(self, gen=None):
+        """丢弃当前已写入的全部音频并推进代号(打断)，可在任意线程调用；gen 指定新代号，默认加一。"""
+        with self._lock:
+            self._discard = self._w
+            self._gen = self._gen + 1 if gen is None else gen
@@ -1,10 +1,10 @@
 import time
 import numpy as np
 
-import queue
-from queue import Queue
 import multiprocessing as mp
 
+from asr.audioring import AudioRing
+
 
 class BaseASR:
     def __init__(self, opt):
@@ -13,7 +13,8 @@ class BaseASR:
         self.fps = opt.fps # 20 ms per frame
         self.sample_rate = 16000
         self.chunk = self.sample_rate // self.fps # 320 samples per chunk (20ms * 16000 / 1000)
-        self.queue = Queue()
+        # 输入音频环形缓冲(预留60秒，不够时自动扩容)，按批读写而不是逐帧进出队列
+        self.ring = AudioRing(self.sample_rate * 60, self.chunk)
         self.output_queue = mp.Queue()
 
         self.batch_size = opt.batch_size
@@ -23,34 +24,43 @@ class BaseASR:
         self.stride_right_size = opt.r
         #self.context_size = 10
         self.feat_queue = mp.Queue(2)
+        self.metrics = None  # StageMetrics，由 LipReal 注入
 
         #self.warm_up()
 
-    def pause_talk(self):
-        self.queue.queue.clear()
+    def pause_talk(self, gen=None):
+        self.ring.clear(gen)
 
     def put_audio_frame(self,audio_chunk): #16khz 20ms pcm
-        self.queue.put(audio_chunk)
+        self.ring.write(audio_chunk)
+
+    def put_audio_block(self, pcm, gen=None):
+        """整段写入 16khz pcm: int16 数组或其原始字节一次向量化转换为 float32，float 数组直接写入。
+        gen 为写入方看到的缓冲代号，期间发生过打断则丢弃。"""
+        if isinstance(pcm, (bytes, bytearray, memoryview)):
+            pcm = np.frombuffer(pcm, dtype=np.int16)
+        if pcm.dtype == np.int16:
+            pcm = pcm.astype(np.float32)
+            pcm *= 1 / 32768.
+        self.ring.write(pcm, gen)
 
-    def get_audio_frame(self):        
-        try:
-            frame = self.queue.get(block=True,timeout=0.01)
-            type = 0
-            #print(f'[INFO] get frame {frame.shape}')
-        except queue.Empty:
-            frame = np.zeros(self.chunk, dtype=np.float32)
-            type = 1
+    def get_audio_frames(self, n):
+        """一次取 n 帧: 返回 ((n, chunk) float32, (n,) 类型, 缓冲代号)，缺的帧补静音(类型1)。
+        等待上限与原先逐帧各等10ms的总和相同，保持无音频时的节拍不变。"""
+        return self.ring.read(n, timeout=0.01 * n)
 
-        return frame,type 
+    def get_audio_frame(self):
+        frames, types, _ = self.get_audio_frames(1)
+        return frames[0], int(types[0])
 
     def get_audio_out(self):  #get origin audio pcm to nerf
         return self.output_queue.get()
     
     def warm_up(self):
-        for _ in range(self.stride_left_size + self.stride_right_size):
-            audio_frame,type=self.get_audio_frame()
+        frames, types, _ = self.get_audio_frames(self.stride_left_size + self.stride_right_size)
+        for audio_frame,type in zip(frames, types):
             self.frames.append(audio_frame)
-            self.output_queue.put((audio_frame,type))
+            self.output_queue.put((audio_frame,int(type)))
         for _ in range(self.stride_left_size):
             self.output_queue.get()
 
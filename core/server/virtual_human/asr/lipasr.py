@@ -11,37 +11,71 @@ from wav2lip import audio
 
 class LipASR(BaseASR):
 
+    def __init__(self, opt):
+        super().__init__(opt)
+        # 流式mel: 预加重状态和STFT重叠跨步保留，每步只计算新增的hop
+        self.mel_stream = audio.StreamingMel()
+        self.mel_buffer = np.zeros((80, 0))
+        self.mel_base = 0  # mel_buffer 第0列在整条音频流中的mel帧号
+        self.audio_count = 0  # 已送入mel流的音频帧数
+        self.video_count = 0  # 已产出的视频帧(mel块)数
+        # 待发出的音频帧及类型: 与mel块一起按批打包送给推理进程，每个视频帧对应两个音频帧
+        self.out_pcm = np.zeros((0, self.chunk), dtype=np.float32)
+        self.out_types = np.zeros(0, dtype=np.int8)
+        self.out_epoch = 0  # 待发出音频所属的打断代号
+
+    def warm_up(self):
+        frames, types, self.out_epoch = self.get_audio_frames(self.stride_left_size + self.stride_right_size)
+        self.frames.append(frames.reshape(-1))
+        # 输出音频比mel流滞后 stride_left 帧: 丢弃前 stride_left 帧，其余留待与第一个mel块一起发出
+        self.out_pcm = frames[self.stride_left_size:]
+        self.out_types = types[self.stride_left_size:].astype(np.int8)
+
     def run_step(self):
         ############################################## extract audio feature ##############################################
-        # get a frame of audio
-        for _ in range(self.batch_size*2):
-            frame,type = self.get_audio_frame()
-            self.frames.append(frame)
-            # put to output
-            self.output_queue.put((frame,type))
-        # context not enough, do not run network.
-        if len(self.frames) <= self.stride_left_size + self.stride_right_size:
-            return
+        # 一次从环形缓冲取出整批音频帧 (batch*2, chunk)，连同这批数据所属的缓冲代号(即打断代号)
+        frames, types, epoch = self.get_audio_frames(self.batch_size*2)
+        if epoch != self.out_epoch:
+            # 被打断: 尚未发出的旧音频换成静音
+            self.out_pcm = np.zeros_like(self.out_pcm)
+            self.out_types = np.ones_like(self.out_types)
+            self.out_epoch = epoch
+        self.out_pcm = np.concatenate((self.out_pcm, frames))
+        self.out_types = np.concatenate((self.out_types, types.astype(np.int8)))
         
-        inputs = np.concatenate(self.frames) # [N * chunk]
-        mel = audio.melspectrogram(inputs)
-        #print(mel.shape[0],mel.shape,len(mel[0]),len(self.frames))
-        # cut off stride
+        t = time.perf_counter()
+        pcm = frames.reshape(-1)
+        if self.frames: # warm_up 留下的帧
+            pcm = np.concatenate(self.frames + [pcm])
+            self.frames = []
+        self.audio_count += len(pcm) // self.chunk
+        mel = self.mel_stream.push(pcm) # [N * chunk]
+        self.mel_buffer = np.concatenate((self.mel_buffer, mel), axis=1)
+        # context not enough, do not run network.
+        # 第 j 个视频帧对应的mel块起点为 left + j * mel_idx_multiplier (整条流上的mel帧号)，
+        # 与原先逐窗口计算时的位置一致，只是hop网格固定在流上而不随窗口漂移
         left = max(0, self.stride_left_size*80/50)
-        right = min(len(mel[0]), len(mel[0]) - self.stride_right_size*80/50)
         mel_idx_multiplier = 80.*2/self.fps 
         mel_step_size = 16
-        i = 0
-        mel_chunks = []
-        while i < (len(self.frames)-self.stride_left_size-self.stride_right_size)/2:
-            start_idx = int(left + i * mel_idx_multiplier)
-            #print(start_idx)
-            if start_idx + mel_step_size > len(mel[0]):
-                mel_chunks.append(mel[:, len(mel[0]) - mel_step_size:])
-            else:
-                mel_chunks.append(mel[:, start_idx : start_idx + mel_step_size])
-            i += 1
-        self.feat_queue.put(mel_chunks)
+        # 本步新增的视频帧一次性算出全部起点，在滑动窗口视图上按起点取块，得到 (batch, 80, 16) 的连续数组
+        video_end = (self.audio_count-self.stride_left_size-self.stride_right_size)//2
+        if video_end <= self.video_count:
+            return
+        starts = (left + np.arange(self.video_count, video_end) * mel_idx_multiplier).astype(np.int64) - self.mel_base
+        starts = np.minimum(starts, self.mel_buffer.shape[1] - mel_step_size)
+        windows = np.lib.stride_tricks.sliding_window_view(self.mel_buffer, mel_step_size, axis=1)
+        mel_block = np.ascontiguousarray(windows[:, starts].transpose(1, 0, 2), dtype=np.float32)
+        self.video_count = video_end
+        if self.metrics is not None:
+            self.metrics.observe('mel', time.perf_counter() - t)
+        # mel块和对应的音频帧、类型作为一个条目发送，每个batch只有一次序列化和管道往返
+        n = len(mel_block) * 2
+        self.feat_queue.put((mel_block, self.out_pcm[:n], self.out_types[:n], self.out_epoch))
+        self.out_pcm = self.out_pcm[n:]
+        self.out_types = self.out_types[n:]
         
         # discard the old part to save memory
-        self.frames = self.frames[-(self.stride_left_size + self.stride_right_size):]
\ No newline at end of file
+        keep = int(left + self.video_count * mel_idx_multiplier) - self.mel_base
+        if keep > 0:
+            self.mel_buffer = self.mel_buffer[:, keep:]
+            self.mel_base += keep
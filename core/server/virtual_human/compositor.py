@@ -0,0 +1,73 @@
+import numpy as np
+import cv2
+from av import VideoFrame
+
+
+def plane_view(frame):
+    """bgr24 VideoFrame 像素平面的 (H, W, 3) 可写视图(跳过行尾对齐填充)。"""
+    plane = frame.planes[0]
+    rows = np.frombuffer(plane, dtype=np.uint8).reshape(plane.height, plane.line_size)
+    return rows[:, :plane.width * 3].reshape(plane.height, plane.width, 3)
+
+
+class FrameCompositor:
+    """
+    把口型帧贴回整帧并直接产出 VideoFrame。
+    VideoFrame.from_ndarray 本身就会把像素拷进新帧，所以底图直接拷进输出帧、口型块原地写进帧的像素平面，
+    不再先 deepcopy 一份整帧；口型帧 resize 到按 bbox 尺寸预分配的缓冲，稳态下每帧没有额外的 numpy 分配。
+    """
+
+    def __init__(self):
+        self.crops = {}
+
+    def _crop(self, h, w):
+        crop = self.crops.get((h, w))
+        if crop is None:
+            crop = self.crops[(h, w)] = np.empty((h, w, 3), dtype=np.uint8)
+        return crop
+
+    def compose(self, base_frame, res_frame=None, bbox=None):
+        """res_frame 为 None 时直接输出底图(静音帧)。"""
+        frame = VideoFrame.from_ndarray(base_frame, format="bgr24")
+        if res_frame is not None:
+            y1, y2, x1, x2 = bbox
+            crop = self._crop(y2 - y1, x2 - x1)
+            cv2.resize(res_frame.astype(np.uint8, copy=False), (x2 - x1, y2 - y1), dst=crop)
+            plane_view(frame)[y1:y2, x1:x2] = crop
+        return frame
+
+
+if __name__ == '__main__':
+    # 微基准: 原 deepcopy + resize + from_ndarray 路径 vs 直接合成，输出每秒帧数
+    import copy
+    import time
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--width', type=int, default=1080)
+    parser.add_argument('--height', type=int, default=1920)
+    parser.add_argument('--frames', type=int, default=300)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (args.height, args.width, 3), dtype=np.uint8)
+    res = rng.integers(0, 255, (256, 256, 3), dtype=np.uint8)
+    bbox = (args.height // 3, args.height // 3 + 300, args.width // 3, args.width // 3 + 280)
+    y1, y2, x1, x2 = bbox
+
+    def legacy():
+        combine_frame = copy.deepcopy(base)
+        combine_frame[y1:y2, x1:x2] = cv2.resize(res.astype(np.uint8), (x2 - x1, y2 - y1))
+        return VideoFrame.from_ndarray(combine_frame, format="bgr24")
+
+    compositor = FrameCompositor()
+    assert np.array_equal(legacy().to_ndarray(format="bgr24"),
+                          compositor.compose(base, res, bbox).to_ndarray(format="bgr24"))
+
+    for name, fn in (('deepcopy', legacy), ('composite', lambda: compositor.compose(base, res, bbox))):
+        for _ in range(16):
+            fn()
+        t = time.perf_counter()
+        for _ in range(args.frames):
+            fn()
+        print(f'{name:<10}{args.frames / (time.perf_counter() - t):>10.1f} frames/s')
@@ -0,0 +1,69 @@
+import os
+import queue
+
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+
+class FrameRing:
+    """
+    推理进程 -> process_frames 之间的共享内存帧环。
+    预分配 slots 个 uint8 口型帧槽位，描述符(slot, idx, audio_frames)仍走小队列，
+    写端在空闲槽位耗尽时阻塞，由此形成背压；读端拿到的是共享内存上的视图，不做拷贝。
+    空闲槽位号放在队列里，读端用完哪个槽位就放回哪个，不要求按写入顺序释放。
+    """
+
+    def __init__(self, slots, max_shape=(256, 256, 3)):
+        self.slots = slots
+        self.max_shape = tuple(max_shape)
+        self.slot_bytes = int(np.prod(self.max_shape))
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+        self.free = mp.Queue(self.slots)  # 空闲槽位号
+        for slot in range(self.slots):
+            self.free.put(slot)
+        self._owner = os.getpid()  # 只有创建者进程 close 时删除共享内存(fork 出的子进程继承的副本也不删)
+        self._buf = None
+        self.closed = False
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_buf'] = None
+        state['_owner'] = None
+        return state
+
+    def _slots_view(self):
+        if self._buf is None:
+            self._buf = np.ndarray((self.slots, self.slot_bytes), dtype=np.uint8, buffer=self.shm.buf)
+        return self._buf
+
+    def fits(self, shape):
+        return len(shape) == 3 and all(s <= m for s, m in zip(shape, self.max_shape))
+
+    def write(self, frame, timeout=None):
+        """把一帧(float 或 uint8)写入下一个空闲槽位，返回槽位号；超时返回 None。"""
+        try:
+            slot = self.free.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        dst = self.view(slot, frame.shape)
+        # 与原来 res_frame.astype(np.uint8) 的截断语义一致
+        np.copyto(dst, frame, casting='unsafe')
+        return slot
+
+    def view(self, slot, shape):
+        n = int(np.prod(shape))
+        return self._slots_view()[slot, :n].reshape(shape)
+
+    def release(self, slot):
+        self.free.put(slot)
+
+    def close(self):
+        self.closed = True
+        self._buf = None
+        try:
+            self.shm.close()
+            if self._owner == os.getpid():
+                self.shm.unlink()
+        except Exception:
+            pass
@@ -9,11 +9,11 @@ import time
 import cv2
 import glob
 import pickle
-import copy
 
 import queue
 from queue import Queue
-from threading import Thread, Event
+from threading import Thread, Event, Lock
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 import multiprocessing as mp
 from multiprocessing import Manager
@@ -22,35 +22,23 @@ from tts.ttsreal import EdgeTTS,VoitsTTS,XTTS,CosyVoiceTTS
 
 from asr.lipasr import LipASR
 import asyncio
-from av import AudioFrame, VideoFrame
+from av import AudioFrame
 
-from wav2lip.models import Wav2Lip
+from wav2lip.engine import load_engine
+from wav2lip.avatarpack import open_avatar_pack
+from framering import FrameRing
+from compositor import FrameCompositor
+from metrics import StageMetrics, qsize
+from renderclock import RenderClock
 
 from tqdm import tqdm
 
 device = 'cuda' if torch.cuda.is_available() else 'cpu'
 print('Using {} for inference.'.format(device))
 
-def _load(checkpoint_path):
-    if device == 'cuda':
-        checkpoint = torch.load(checkpoint_path)
-    else:
-        checkpoint = torch.load(checkpoint_path,
-                                map_location=lambda storage, loc: storage)
-    return checkpoint
-
-def load_model(path):
-    model = Wav2Lip()
-    print("Load checkpoint from: {}".format(path))
-    checkpoint = _load(path)
-    s = checkpoint["state_dict"]
-    new_s = {}
-    for k, v in s.items():
-        new_s[k.replace('module.', '')] = v
-    model.load_state_dict(new_s)
-
-    model = model.to(device)
-    return model.eval()
+def load_model(path, engine='eager', channels_last=False):
+    print("Load checkpoint from: {} (engine: {}, channels_last: {})".format(path, engine, channels_last))
+    return load_engine(engine, path, device, channels_last)
 
 def read_imgs(img_list):
     frames = []
@@ -60,131 +48,328 @@ def read_imgs(img_list):
         frames.append(frame)
     return frames
 
-def __mirror_index(size, index):
+# 整个人脸周期预处理后的输入超过该大小时退回逐批构造，避免长视频avatar占满内存
+FACE_INPUT_MAX_BYTES = 2 << 30
+
+class FaceInput:
+    """
+    Wav2Lip 图像侧输入缓存。
+    人脸周期对每个avatar是固定的，加载时一次性构造好 (N,6,H,W) 的归一化张量
+    (前3通道为下半部置零的masked人脸，后3通道为原人脸)，每个batch只需按索引gather。
+    """
+
+    def __init__(self, face_list_cycle, batch_size):
+        self.length = len(face_list_cycle)
+        self.face_list_cycle = face_list_cycle
+        h, w = face_list_cycle[0].shape[:2]
+        self.pin = device == 'cuda'
+        self.cycle = None
+        if self.length * 6 * h * w * 4 > FACE_INPUT_MAX_BYTES:
+            print(f"[Inference] 人脸周期过大({self.length}帧 {h}x{w})，不做预计算")
+            return
+        cycle = torch.empty((self.length, 6, h, w), dtype=torch.float32, pin_memory=self.pin)
+        for i in range(0, self.length, 64):
+            faces = np.asarray(face_list_cycle[i:i + 64]).transpose(0, 3, 1, 2)
+            # 与逐批构造的 float64 /255. 再转 float32 结果逐位一致
+            faces = torch.from_numpy((faces / 255.).astype(np.float32))
+            cycle[i:i + 64, 3:] = faces
+            cycle[i:i + 64, :3] = faces
+        cycle[:, :3, h // 2:] = 0
+        self.cycle = cycle
+        self.batch_buf = torch.empty((batch_size, 6, h, w), dtype=torch.float32, pin_memory=self.pin)
+
+    def gather(self, idxs, out=None):
+        """取一个batch的输入。给定 out 时写入 out(CPU张量)并返回它，否则返回 device 上的张量。"""
+        if self.cycle is None:
+            img_batch = np.asarray([self.face_list_cycle[idx] for idx in idxs])
+            img_masked = img_batch.copy()
+            img_masked[:, img_batch.shape[1]//2:] = 0
+            img_batch = np.concatenate((img_masked, img_batch), axis=3) / 255.
+            img_batch = torch.FloatTensor(np.transpose(img_batch, (0, 3, 1, 2)))
+            if out is None:
+                return img_batch.to(device)
+            out.copy_(img_batch)
+            return out
+        dst = self.batch_buf[:len(idxs)] if out is None else out
+        torch.index_select(self.cycle, 0, torch.as_tensor(idxs, dtype=torch.long), out=dst)
+        return dst.to(device, non_blocking=self.pin) if out is None else dst
+
+def _mirror_index(size, index):
     
     return index % size
 
-def inference(render_event, model_reload_flag, batch_size, shared_data, audio_feat_queue, audio_out_queue, res_frame_queue):
-    import traceback
-
-    def load_current_model():
-        model_path = shared_data.get('model_path', "./models/wav2lip.pth")
-        print(f"[Inference] 加载模型权重: {model_path}")
-        return load_model(model_path)
-
-    model = load_current_model()
-
-    current_face_imgs_path = None
-    face_list_cycle = []
-    length = 0
-    index = 0
-    count = 0
-    counttime = 0
-
-    def load_face_imgs():
-        nonlocal current_face_imgs_path, face_list_cycle, length, index
+def is_silence(types):
+    return bool((types != 0).all())
+
+def speech_frames(types):
+    """逐帧判断静音：每个视频帧对应两个音频帧，按音频帧类型返回含语音、需要推理的视频帧下标。"""
+    return np.flatnonzero((types.reshape(-1, 2) == 0).any(axis=1)).tolist()
+
+def run_model(model, mel_batch, img_batch):
+    # mel_batch 为 LipASR 产出的 (B, 80, 16) float32 连续数组，直接零拷贝转成 (B, 1, 80, 16)
+    mel_batch = torch.from_numpy(np.ascontiguousarray(mel_batch, dtype=np.float32)).unsqueeze(1).to(device)
+
+    pred = model(mel_batch, img_batch)
+    return pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.
+
+class InferChannel:
+    """
+    单个会话与推理进程之间的IPC通道：渲染开关、热载入标记、共享配置、打断代号、
+    特征输入队列(mel块与对应音频帧打包)、结果描述符队列以及共享内存帧环。
+    独立推理进程和共享推理服务都通过它与 LipReal 对接。
+    """
+
+    def __init__(self, manager, batch_size, ring_shape=(256, 256, 3), feat_queue=None):
+        self.batch_size = batch_size
+        # 渲染开关和热载入标记每个循环都要读，放在共享内存里，不走 Manager 的IPC往返
+        self.render_event = mp.Event()
+        self.model_reload_flag = mp.Value('b', False)
+        self.shared_data = manager.dict()
+        # 打断代号: 每次打断加一，各级队列条目都带着产生时的代号，过期条目在每一级被换成静音
+        self.epoch = mp.Value('i', 0)
+        self.feat_queue = feat_queue if feat_queue is not None else mp.Queue(2)
+        self.res_frame_queue = mp.Queue(batch_size*2)
+        self.frame_ring = FrameRing(batch_size*2, ring_shape)
+        self.metrics = StageMetrics()
+
+class InferSession:
+    """
+    推理进程内的会话状态：人脸周期、帧索引，以及把结果写回帧环/描述符队列的发送线程。
+    发送放在独立线程里，共享推理服务不会因为某个会话消费慢而阻塞其它会话。
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.batch_size = channel.batch_size
+        self.face_imgs_path = None
+        self.face_list_cycle = []
+        self.face_input = None
+        self.weights = None
+        self.length = 0
+        self.index = 0
+        self.gen = 0  # avatar代号，随描述符发出，父进程据此在同一帧上切换整帧周期
+        self.outbox = Queue()
+        Thread(target=self.__emit_loop, daemon=True).start()
+
+    def model_path(self):
+        return self.channel.shared_data.get('model_path', "./models/wav2lip.pth")
+
+    def engine(self):
+        return self.channel.shared_data.get('engine', 'eager')
+
+    def channels_last(self):
+        return self.channel.shared_data.get('channels_last', False)
+
+    def weights_key(self):
+        return (self.model_path(), self.engine(), self.channels_last())
+
+    def avatar(self):
+        """当前请求的 (avatar代号, 人脸路径)，两者同在一个条目里，不会读到不配对的代号和路径。"""
+        return self.channel.shared_data.get('avatar', (0, None))
+
+    def read_face_imgs(self, path):
+        """读取(或映射)一个avatar的人脸周期，失败返回 None。"""
+        import traceback
         try:
-            path = shared_data.get('face_imgs_path', None)
             if path is None:
                 print("[Inference] 警告: shared_data 中未找到 face_imgs_path")
-                return False
-            if path != current_face_imgs_path:
-                print(f"[Inference] face_imgs_path变更: {current_face_imgs_path} -> {path}")
-                current_face_imgs_path = path
+                return None
+            if path != self.face_imgs_path:
+                print(f"[Inference] face_imgs_path变更: {self.face_imgs_path} -> {path}")
             else:
-                print(f"[Inference] face_imgs_path 未变更: {current_face_imgs_path}")
-
-            input_face_list = glob.glob(os.path.join(current_face_imgs_path, '*.[jpJP][pnPN]*[gG]'))
+                print(f"[Inference] face_imgs_path 未变更: {self.face_imgs_path}")
+
+            # 优先映射avatar pack(genavatar 或离线生成)，多个会话共享同一份page cache
+            pack = open_avatar_pack(os.path.dirname(path))
+            if pack is not None:
+                print(f"[Inference] 映射avatar pack: {pack.path}，帧数: {len(pack)}")
+                return pack.face_frames
+            input_face_list = glob.glob(os.path.join(path, '*.[jpJP][pnPN]*[gG]'))
             input_face_list = sorted(input_face_list, key=lambda x: int(os.path.splitext(os.path.basename(x))[0]))
             print(f"[Inference] 读取face_imgs列表数量: {len(input_face_list)}，示例: {input_face_list[:3]}")
             if len(input_face_list) == 0:
                 print("[Inference] 警告: 读取到的face_imgs为空，确认目录和文件是否正确")
-                return False
-
-            face_list_cycle = read_imgs(input_face_list)
-            length = len(face_list_cycle)
-            index = 0
-            return True
+                return None
+            return read_imgs(input_face_list)
         except Exception as e:
-            print("[Inference] load_face_imgs异常:", e)
+            print("[Inference] read_face_imgs异常:", e)
             traceback.print_exc()
-            return False
+            return None
 
-    
-    if not load_face_imgs():
+    def load_face(self, path):
+        """读取人脸周期并构造其 FaceInput，失败返回 (None, None)。"""
+        face_list_cycle = self.read_face_imgs(path)
+        face_input = None if face_list_cycle is None else FaceInput(face_list_cycle, self.batch_size)
+        return face_list_cycle, face_input
+
+    def prefetch(self, get_model=None, get_face=None):
+        """
+        预取热载入所需的资源：新avatar的人脸周期及其 FaceInput，权重变化时才加载模型。
+        get_face 给定时由它提供(共享推理服务按路径缓存，同一avatar的会话共用一份)。
+        只读 shared_data、不动正在渲染的状态，可以放在后台线程里跑，结果交给 swap 在batch边界切换。
+        """
+        gen, path = self.avatar()
+        weights = self.weights_key()
+        model = None
+        if get_model is not None and weights != self.weights:
+            model = get_model(weights)
+        face_list_cycle, face_input = (get_face or self.load_face)(path)
+        return gen, path, face_list_cycle, face_input, weights, model
+
+    def swap(self, prefetched):
+        """切换到预取好的资源，返回新模型(权重未变化时为 None)。人脸加载失败时保留旧avatar及其代号。"""
+        gen, path, face_list_cycle, face_input, weights, model = prefetched
+        if model is not None:
+            self.weights = weights
+        if face_input is not None:
+            self.face_imgs_path = path
+            self.face_input = face_input
+            self.face_list_cycle = face_list_cycle
+            self.length = len(face_list_cycle)
+            self.index = 0
+            self.gen = gen
+        return model
+
+    def load_face_imgs(self):
+        return self.swap(self.prefetch()) is None and self.length > 0
+
+    def face_shape(self):
+        return tuple(self.face_list_cycle[0].shape) if self.length > 0 else None
+
+    def busy(self):
+        return self.outbox.qsize() >= self.batch_size
+
+    def poll(self, timeout=None):
+        """
+        取一个batch的mel特征及对应的音频帧，没有数据时抛出 queue.Empty。
+        audio_frames 为 (pcm (batch*2, chunk), 类型 (batch*2,), 打断代号)，已过期的换成静音。
+        """
+        if timeout:
+            mel_batch, pcm, types, epoch = self.channel.feat_queue.get(block=True, timeout=timeout)
+        else:
+            mel_batch, pcm, types, epoch = self.channel.feat_queue.get_nowait()
+        return mel_batch, self.drop_stale((pcm, types, epoch))
+
+    def stale(self, audio_frames):
+        return audio_frames[2] != self.channel.epoch.value
+
+    def drop_stale(self, audio_frames):
+        """打断前产生的音频换成静音并标上当前代号，对应的帧不再推理。"""
+        if not self.stale(audio_frames):
+            return audio_frames
+        pcm, types, _ = audio_frames
+        return np.zeros_like(pcm), np.ones_like(types), self.channel.epoch.value
+
+    def face_idxs(self, n, offset=0):
+        return [_mirror_index(self.length, self.index + offset + i) for i in range(n)]
+
+    def face_batch(self, n, active=None):
+        idxs = self.face_idxs(n)
+        if active is not None:
+            idxs = [idxs[i] for i in active]
+        return self.face_input.gather(idxs)
+
+    def emit(self, pred, audio_frames, active=None):
+        """
+        按原顺序发送一个batch的结果，pred 为 None 表示整批静音。
+        给定 active 时 pred 只含这些帧(压缩后的推理结果)，其余静音帧发送 None，由原avatar帧直出。
+        """
+        pcm, types, epoch = audio_frames
+        rows = None if active is None else dict(zip(active, range(len(active))))
+        for i in range(len(types) // 2):
+            if pred is None:
+                res_frame = None
+            elif rows is None:
+                res_frame = pred[i]
+            else:
+                row = rows.get(i)
+                res_frame = None if row is None else pred[row]
+            self.outbox.put((res_frame, _mirror_index(self.length, self.index), (pcm[i*2:i*2+2], types[i*2:i*2+2]), self.gen, epoch))
+            self.index += 1
+
+    def __emit_loop(self):
+        frame_ring = self.channel.frame_ring
+        while True:
+            res_frame, idx, audio_frames, gen, epoch = self.outbox.get()
+            if epoch != self.channel.epoch.value:
+                # 发送前已被打断: 不再写帧环，按静音帧发出
+                pcm, types = audio_frames
+                res_frame, audio_frames, epoch = None, (np.zeros_like(pcm), np.ones_like(types)), self.channel.epoch.value
+            # 口型帧写入共享内存环，队列里只传槽位描述符；尺寸放不下时退回直接传数组
+            if res_frame is not None and frame_ring.fits(res_frame.shape):
+                res_frame = (frame_ring.write(res_frame), res_frame.shape)
+            self.channel.res_frame_queue.put((res_frame, idx, audio_frames, gen, epoch))
+
+def inference(channel):
+    import traceback
+
+    session = InferSession(channel)
+
+    def load_weights(weights):
+        print(f"[Inference] 加载模型权重: {weights[0]}")
+        return load_model(*weights)
+
+    session.weights = session.weights_key()
+    model = load_weights(session.weights)
+    count = 0
+    counttime = 0
+
+    if not session.load_face_imgs():
         print("[Inference] 初始加载face_imgs失败，请检查资源路径和文件")
 
+    # 热载入在后台线程预取，旧avatar继续渲染，预取完成后在batch边界切换
+    prefetcher = ThreadPoolExecutor(max_workers=1)
+    reload = None
     print('start inference')
     while True:
         try:
-            if model_reload_flag.value:
-                print("[Inference] 收到模型热载入标记")
+            if reload is None and channel.model_reload_flag.value:
+                channel.model_reload_flag.value = False
+                print("[Inference] 收到热载入标记，后台预取新资源")
+                reload = prefetcher.submit(session.prefetch, load_weights)
+            if reload is not None and reload.done():
                 try:
-                    model = load_current_model()
+                    new_model = session.swap(reload.result())
+                    if new_model is not None:
+                        model = new_model
+                    print(f"[Inference] 热载入完成，切换到avatar代号 {session.gen}")
                 except Exception as e:
-                    print(f"[Inference] 模型热载入失败: {e}")
+                    print(f"[Inference] 热载入失败: {e}")
                     traceback.print_exc()
+                reload = None
 
-                if not load_face_imgs():
-                    print("[Inference] 热载入时加载face_imgs失败")
-
-                model_reload_flag.value = False
-                print("[Inference] 模型及资源热载入完成")
-
-            if render_event.is_set():
-                mel_batch = []
+            if channel.render_event.is_set():
+                # 发送线程积压一个batch以上时先等 process_frames 释放帧环槽位，outbox 不会无限增长
+                if session.busy():
+                    time.sleep(0.005)
+                    continue
                 try:
-                    mel_batch = audio_feat_queue.get(block=True, timeout=1)
+                    mel_batch, audio_frames = session.poll(timeout=1)
                 except queue.Empty:
                     continue
 
-                is_all_silence = True
-                audio_frames = []
-                for _ in range(batch_size * 2):
-                    frame, type_ = audio_out_queue.get()
-                    audio_frames.append((frame, type_))
-                    if type_ == 0:
-                        is_all_silence = False
-
-                if is_all_silence:
-                    for i in range(batch_size):
-                        res_frame_queue.put((None, __mirror_index(length, index), audio_frames[i*2:i*2+2]))
-                        index += 1
+                active = speech_frames(audio_frames[1])
+                if not active:
+                    session.emit(None, audio_frames)
                 else:
+                    # 只把含语音的帧压缩成一个小batch推理，静音帧直接用原avatar帧
                     t = time.perf_counter()
-                    img_batch = []
-                    for i in range(batch_size):
-                        idx = __mirror_index(length, index + i)
-                        if idx >= length:
-                            print(f"[Inference] 警告: idx={idx} 越界 length={length}，取模后使用")
-                            idx = idx % length
-                        face = face_list_cycle[idx]
-                        img_batch.append(face)
-                    img_batch, mel_batch = np.asarray(img_batch), np.asarray(mel_batch)
-
-                    img_masked = img_batch.copy()
-                    img_masked[:, face.shape[0]//2:] = 0
-
-                    img_batch = np.concatenate((img_masked, img_batch), axis=3) / 255.
-                    mel_batch = np.reshape(mel_batch, [len(mel_batch), mel_batch.shape[1], mel_batch.shape[2], 1])
-
-                    img_batch = torch.FloatTensor(np.transpose(img_batch, (0, 3, 1, 2))).to(device)
-                    mel_batch = torch.FloatTensor(np.transpose(mel_batch, (0, 3, 1, 2))).to(device)
-
-                    with torch.no_grad():
-                        pred = model(mel_batch, img_batch)
-                    pred = pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.
-
-                    counttime += (time.perf_counter() - t)
-                    count += batch_size
+                    if len(active) < len(mel_batch):
+                        pred = run_model(model, mel_batch[active], session.face_batch(len(mel_batch), active))
+                    else:
+                        active = None
+                        pred = run_model(model, mel_batch, session.face_batch(len(mel_batch)))
+
+                    elapsed = time.perf_counter() - t
+                    channel.metrics.observe('infer', elapsed)
+                    counttime += elapsed
+                    count += len(pred)
                     if count >= 100:
                         print(f"------actual avg infer fps: {count / counttime:.4f}")
                         count = 0
                         counttime = 0
 
-                    for i, res_frame in enumerate(pred):
-                        res_frame_queue.put((res_frame, __mirror_index(length, index), audio_frames[i*2:i*2+2]))
-                        index += 1
+                    session.emit(pred, audio_frames, active)
             else:
                 time.sleep(0.1)
         except Exception as e:
@@ -194,8 +379,211 @@ def inference(render_event, model_reload_flag, batch_size, shared_data, audio_fe
             time.sleep(1)
     print('musereal inference processor stop')
 
-class LipReal:
+# 共享推理服务检查各会话热载入标记的最小间隔(秒)
+RELOAD_POLL_INTERVAL = 0.1
+
+def lip_infer_server(channels, max_batch, max_delay):
+    """
+    跨会话的共享 Wav2Lip 推理服务：所有会话共用一份模型(按权重路径缓存)，
+    把各会话的 mel/人脸请求动态合批，凑满 max_batch 帧或最早的请求排队超过 max_delay 秒即推理，
+    按轮转顺序取各会话请求保证公平，结果分发回各自的帧队列。
+    """
+    import traceback
+
+    sessions = [InferSession(channel) for channel in channels]
+    reloads = [None for _ in sessions]
+    prefetcher = ThreadPoolExecutor(max_workers=1)
+    pending = [[] for _ in sessions]  # 每个会话: [(到达时间, mel_batch, audio_frames, 含语音的帧下标)]
+    models = {}
+    rr = 0
+    count = 0
+    counttime = 0
+    reload_polled = 0
+
+    def get_model(weights):
+        if weights not in models:
+            print(f"[InferServer] 加载模型权重: {weights}")
+            models[weights] = load_model(*weights)
+        return models[weights]
+
+    # 合批的图像输入缓冲按人脸尺寸一次分配 max_batch 帧(锁页)，每个batch取前 frames 帧，不再逐batch分配锁页内存。
+    # run_model 取回结果时已同步，下一个batch复用缓冲前异步拷贝早已完成
+    host_buffers = {}
+
+    def host_buffer(h, w, frames):
+        buf = host_buffers.get((h, w))
+        if buf is None or len(buf) < frames:
+            buf = torch.empty((max(max_batch, frames), 6, h, w), dtype=torch.float32, pin_memory=device == 'cuda')
+            host_buffers[(h, w)] = buf
+        return buf[:frames]
+
+    # 人脸周期及其 FaceInput 按 (人脸路径, batch) 缓存，同一avatar的会话共用一份锁页张量。
+    # 这里的 gather 都写入调用方给的 out，不会用到 FaceInput 自带的 batch 缓冲，共用是安全的
+    faces = {}
+
+    def get_face(session):
+        def load(path):
+            # 只保留仍有会话在用或已请求切换到的条目(被替换的旧avatar在 swap 之前也还在用)
+            in_use = {(p, s.batch_size) for s in sessions
+                      for p in (s.face_imgs_path, s.avatar()[1])}
+            for key in [key for key in faces if key not in in_use]:
+                del faces[key]
+            key = (path, session.batch_size)
+            if key not in faces:
+                face = session.load_face(path)
+                if face[1] is None:
+                    return face
+                faces[key] = face
+            else:
+                print(f"[InferServer] 复用已加载的人脸周期: {path}")
+            return faces[key]
+        return load
+
+    print(f'start inference server, sessions={len(sessions)} max_batch={max_batch} max_delay={max_delay}s')
+    while True:
+        try:
+            # 热载入在后台线程预取(模型按权重缓存，未变化不重载)，完成后在batch边界切换。
+            # 标记最多每 RELOAD_POLL_INTERVAL 秒检查一次
+            poll_reload = time.perf_counter() - reload_polled >= RELOAD_POLL_INTERVAL
+            if poll_reload:
+                reload_polled = time.perf_counter()
+            for i, session in enumerate(sessions):
+                if poll_reload and reloads[i] is None and session.channel.model_reload_flag.value:
+                    session.channel.model_reload_flag.value = False
+                    print(f"[InferServer] 会话{i} 收到热载入标记，后台预取新资源")
+                    reloads[i] = prefetcher.submit(session.prefetch, get_model, get_face(session))
+                if reloads[i] is not None and reloads[i].done():
+                    try:
+                        session.swap(reloads[i].result())
+                        print(f"[InferServer] 会话{i} 热载入完成，avatar代号 {session.gen}")
+                    except Exception as e:
+                        print(f"[InferServer] 会话{i} 热载入失败: {e}")
+                        traceback.print_exc()
+                    reloads[i] = None
+
+            # 收集各会话的新请求，静音batch直接放行不占推理预算
+            now = time.perf_counter()
+            rendering = False
+            for i, session in enumerate(sessions):
+                if not session.channel.render_event.is_set():
+                    continue
+                rendering = True
+                if session.length == 0 or session.weights is None or session.busy() or len(pending[i]) >= 2:
+                    continue
+                try:
+                    mel_batch, audio_frames = session.poll()
+                except queue.Empty:
+                    continue
+                pending[i].append((now, mel_batch, audio_frames, speech_frames(audio_frames[1])))
+
+            for i, session in enumerate(sessions):
+                # 排队期间被打断的请求换成静音
+                pending[i] = [(t_, mel, session.drop_stale(af), []) if session.stale(af) else (t_, mel, af, active)
+                              for t_, mel, af, active in pending[i]]
+                # 队首的静音batch直接放行，不占推理预算，也不打乱会话内的帧顺序
+                while pending[i] and not pending[i][0][3]:
+                    session.emit(None, pending[i].pop(0)[2])
+
+            waiting = [i for i in range(len(sessions)) if pending[i]]
+            if not waiting:
+                # 没有会话在渲染时按 inference() 的节奏空转
+                time.sleep(0.002 if rendering else 0.1)
+                continue
+            # 只有含语音的帧占推理预算
+            total = sum(len(req[3]) for i in waiting for req in pending[i])
+            oldest = min(pending[i][0][0] for i in waiting)
+            if total < max_batch and time.perf_counter() - oldest < max_delay:
+                time.sleep(0.001)
+                continue
+
+            # 轮转挑选请求组成一个batch，只合并权重和人脸尺寸相同的会话
+            order = [(rr + k) % len(sessions) for k in range(len(sessions))]
+            rr = (rr + 1) % len(sessions)
+            picked = []
+            offsets = [0] * len(sessions)
+            frames = 0
+            key = None
+            progress = True
+            while progress and frames < max_batch:
+                progress = False
+                for i in order:
+                    if not pending[i] or not pending[i][0][3]:
+                        continue
+                    session = sessions[i]
+                    k = (session.weights, session.face_shape())
+                    n = len(pending[i][0][3])
+                    if key is None:
+                        key = k
+                    elif k != key or frames + n > max_batch:
+                        continue
+                    _, mel_batch, audio_frames, active = pending[i].pop(0)
+                    idxs = session.face_idxs(len(mel_batch), offsets[i])
+                    picked.append((session, mel_batch[active], audio_frames, active, [idxs[j] for j in active]))
+                    offsets[i] += len(mel_batch)
+                    frames += n
+                    progress = True
+
+            t = time.perf_counter()
+            h, w = key[1][:2]
+            img_batch = host_buffer(h, w, frames)
+            offset = 0
+            for session, _, _, _, idxs in picked:
+                session.face_input.gather(idxs, out=img_batch[offset:offset + len(idxs)])
+                offset += len(idxs)
+            img_batch = img_batch.to(device, non_blocking=device == 'cuda')
+            mel_batch = np.concatenate([mel for _, mel, _, _, _ in picked])
+            pred = run_model(get_model(key[0]), mel_batch, img_batch)
+            elapsed = time.perf_counter() - t
+            # 每个参与的会话记一次，按其帧数分摊本batch的耗时(同一会话的多个请求合并计)
+            shares = {}
+            for session, mel, _, _, _ in picked:
+                shares[session] = shares.get(session, 0) + len(mel)
+            for session, n in shares.items():
+                session.channel.metrics.observe('infer', elapsed * n / frames)
+            counttime += elapsed
+            count += frames
+            if count >= 100:
+                print(f"------actual avg infer fps: {count / counttime:.4f}, batch frames: {frames}")
+                count = 0
+                counttime = 0
+
+            offset = 0
+            for session, mel, audio_frames, active, _ in picked:
+                n = len(mel)
+                session.emit(pred[offset:offset + n], audio_frames, active)
+                offset += n
+            for i, session in enumerate(sessions):
+                while pending[i] and not pending[i][0][3]:
+                    session.emit(None, pending[i].pop(0)[2])
+        except Exception as e:
+            print("[InferServer] 主循环异常:", e)
+            traceback.print_exc()
+            time.sleep(1)
+
+class LipInferServer:
+    """
+    父进程侧的共享推理服务句柄：为 max_session 个会话预建IPC通道后启动推理进程，
+    LipReal 通过 attach() 领取一个通道。
+    """
+
     def __init__(self, opt):
+        self.manager = Manager()
+        self.channels = [InferChannel(self.manager, opt.batch_size) for _ in range(opt.max_session)]
+        self.free_channels = list(self.channels)
+        self.process = mp.Process(target=lip_infer_server, args=(
+            self.channels,
+            opt.infer_max_batch,
+            opt.infer_max_delay / 1000.,
+        ), daemon=True)
+        self.process.start()
+
+    def attach(self):
+        if not self.free_channels:
+            raise RuntimeError('共享推理服务没有空闲的会话通道')
+        return self.free_channels.pop(0)
+
+class LipReal:
+    def __init__(self, opt, infer_server=None):
         self.opt = opt 
         self.W = opt.W
         self.H = opt.H
@@ -213,11 +601,18 @@ class LipReal:
 
         self.batch_size = opt.batch_size
         self.idx = 0
-        self.res_frame_queue = mp.Queue(self.batch_size*2)
         #self.__loadmodels()
         self.__loadavatar()
+        self.avatar_gen = 0
+        self.__next_gen = 0
+        self.__avatars = {}  # 代号 -> 预取好、等待推理侧切换的 (整帧周期, 坐标)
+        self.__avatar_lock = Lock()
 
         self.asr = LipASR(opt)
+        if infer_server is not None:
+            # 共享推理服务模式: 使用服务预建的通道，ASR直接往通道的队列里送特征和音频
+            self.channel = infer_server.attach()
+            self.asr.feat_queue = self.channel.feat_queue
         self.asr.warm_up()
         if opt.tts == "edgetts":
             self.tts = EdgeTTS(opt,self)
@@ -237,50 +632,117 @@ class LipReal:
                         time.sleep(0.1)
             self.tts = DummyTTS()
 
-        self.manager = Manager()
-        self.shared_data = self.manager.dict()
-        self.shared_data['face_imgs_path'] = self.face_imgs_path
+        if infer_server is None:
+            self.manager = Manager()
+            self.channel = InferChannel(self.manager, self.batch_size, self.__face_shape(), self.asr.feat_queue)
+        self.res_frame_queue = self.channel.res_frame_queue
+        self.frame_ring = self.channel.frame_ring
+        self.compositor = FrameCompositor()
+        self.metrics = self.channel.metrics
+        self.asr.metrics = self.metrics
+        self.epoch = self.channel.epoch
+        self.asr.ring.clear(self.epoch.value)  # 音频缓冲的代号与打断代号一致
+        self.interrupted = None  # (打断时刻, 打断后的代号)，音频轨道送出打断后的第一帧时计量并清空
+        self.audio_track = None
+        self.video_track = None
+        self.loop = None
+        self.tracks_event = Event()  # 有轨道挂上时置位，没有轨道时渲染循环停在这里等待
+        self.idle_backlog = getattr(opt, 'tts_lookahead', 3.0)  # 没有轨道时音频缓冲最多保留的秒数
+        self.render_lock = Lock()
+        self.render_quit = None  # 正在运行的渲染循环的退出事件，每个会话只有一个渲染循环
+        self.shared_data = self.channel.shared_data
+        self.shared_data['avatar'] = (self.avatar_gen, self.face_imgs_path)  # (代号, 人脸路径)作为一个条目发布，推理侧一次读出
         self.shared_data['model_path'] = "./models/wav2lip.pth"
+        self.shared_data['engine'] = getattr(opt, 'infer_engine', 'eager')
+        self.shared_data['channels_last'] = getattr(opt, 'channels_last', False)
 
-        self.render_event = self.manager.Event()
-        self.model_reload_flag = self.manager.Value('b', False)
+        self.render_event = self.channel.render_event
+        self.model_reload_flag = self.channel.model_reload_flag
 
-        self.inference_process = mp.Process(target=inference, args=(
-            self.render_event,
-            self.model_reload_flag,
-            self.batch_size,
-            self.shared_data,
-            self.asr.feat_queue,
-            self.asr.output_queue,
-            self.res_frame_queue,
-        ))
-        self.inference_process.start()
+        if infer_server is None:
+            self.inference_process = mp.Process(target=inference, args=(self.channel,))
+            self.inference_process.start()
+        else:
+            self.inference_process = infer_server.process
+            self.model_reload_flag.value = True  # 通知共享推理服务加载本会话的模型和人脸
+
+    def __face_shape(self):
+        # 帧环槽位按当前avatar的口型尺寸预分配，至少容纳 256x256 (genavatar --img_size 256)
+        h, w = 256, 256
+        pack = open_avatar_pack(self.avatar_path)
+        if pack is not None:
+            h, w = max(h, pack.header['face_shape'][0]), max(w, pack.header['face_shape'][1])
+            return (h, w, 3)
+        face_list = glob.glob(os.path.join(self.face_imgs_path, '*.[jpJP][pnPN]*[gG]'))
+        if face_list:
+            face = cv2.imread(face_list[0])
+            if face is not None:
+                h, w = max(h, face.shape[0]), max(w, face.shape[1])
+        return (h, w, 3)
+
+    def __read_avatar(self, avatar_path):
+        """读取一个avatar的整帧周期和人脸坐标，优先映射avatar pack(由 genavatar 或离线生成，这里不生成)。"""
+        pack = open_avatar_pack(avatar_path)
+        if pack is not None:
+            print(f"[LipReal] 映射avatar pack: {pack.path}，帧数: {len(pack)}")
+            pack.prefetch()
+            return pack.full_frames, pack.coords.tolist()
+        print(f"[LipReal] {avatar_path} 没有可用的avatar pack，逐张读取图片；"
+              f"可离线生成: python -m wav2lip.avatarpack {avatar_path}")
+        with open(os.path.join(avatar_path, "coords.pkl"), 'rb') as f:
+            coord_list_cycle = pickle.load(f)
+        input_img_list = glob.glob(os.path.join(avatar_path, "full_imgs", '*.[jpJP][pnPN]*[gG]'))
+        input_img_list = sorted(input_img_list, key=lambda x: int(os.path.splitext(os.path.basename(x))[0]))
+        return read_imgs(input_img_list), coord_list_cycle
 
     def __loadavatar(self):
-        with open(self.coords_path, 'rb') as f:
-            self.coord_list_cycle = pickle.load(f)
-        input_img_list = glob.glob(os.path.join(self.full_imgs_path, '*.[jpJP][pnPN]*[gG]'))
-        input_img_list = sorted(input_img_list, key=lambda x: int(os.path.splitext(os.path.basename(x))[0]))
-        self.frame_list_cycle = read_imgs(input_img_list)
+        self.frame_list_cycle, self.coord_list_cycle = self.__read_avatar(self.avatar_path)
 
     def load_avatar(self, avatar_folder_path):
+        """
+        热切换avatar：后台线程预取新avatar，旧avatar照常渲染；预取完成后以新代号通知推理侧，
+        推理侧在batch边界切换并给描述符打上新代号，process_frames 见到新代号时换用新的整帧周期。
+        """
         print(f"[LipReal] 切换avatar资源到: {avatar_folder_path}")
-        self.avatar_path = avatar_folder_path
-        self.full_imgs_path = os.path.join(self.avatar_path, "full_imgs")
-        self.face_imgs_path = os.path.join(self.avatar_path, "face_imgs")
-        self.coords_path = os.path.join(self.avatar_path, "coords.pkl")
+        with self.__avatar_lock:
+            self.__next_gen += 1
+            gen = self.__next_gen
+        Thread(target=self.__prefetch_avatar, args=(avatar_folder_path, gen), daemon=True).start()
 
+    def __prefetch_avatar(self, avatar_folder_path, gen):
         try:
-            self.__loadavatar()
-            print(f"[LipReal] 加载资源目录: {self.avatar_path}")
+            avatar = self.__read_avatar(avatar_folder_path)
+            print(f"[LipReal] 预取资源目录完成: {avatar_folder_path}")
         except Exception as e:
             print(f"[LipReal] 加载资源失败: {e}")
-
-        self.shared_data['face_imgs_path'] = self.face_imgs_path
-        print(f"[LipReal] 更新shared_data['face_imgs_path']为: {self.face_imgs_path}")
-
-        self.model_reload_flag.value = True
-        print("[LipReal] 设置模型热载入标记为True")
+            return
+        with self.__avatar_lock:
+            if gen != self.__next_gen:
+                print(f"[LipReal] avatar代号 {gen} 已被更新的切换取代，丢弃")
+                return
+            self.__avatars[gen] = avatar
+            self.avatar_path = avatar_folder_path
+            self.full_imgs_path = os.path.join(self.avatar_path, "full_imgs")
+            self.face_imgs_path = os.path.join(self.avatar_path, "face_imgs")
+            self.coords_path = os.path.join(self.avatar_path, "coords.pkl")
+
+            self.shared_data['avatar'] = (gen, self.face_imgs_path)
+            print(f"[LipReal] 更新shared_data['avatar']的人脸路径为: {self.face_imgs_path}，avatar代号: {gen}")
+
+            self.model_reload_flag.value = True
+            print("[LipReal] 设置模型热载入标记为True")
+
+    def __swap_avatar(self, gen):
+        with self.__avatar_lock:
+            avatar = self.__avatars.pop(gen, None)
+            for stale in [g for g in self.__avatars if g < gen]:
+                del self.__avatars[stale]
+        if avatar is None:
+            print(f"[LipReal] 警告: 未找到avatar代号 {gen} 的预取资源")
+            return
+        self.frame_list_cycle, self.coord_list_cycle = avatar
+        self.avatar_gen = gen
+        print(f"[LipReal] 已切换到avatar代号 {gen}")
 
     def put_msg_txt(self,msg):
         self.tts.put_msg_txt(msg)
@@ -288,70 +750,171 @@ class LipReal:
     def put_audio_frame(self,audio_chunk): #16khz 20ms pcm
         self.asr.put_audio_frame(audio_chunk)
 
+    def put_audio_block(self,pcm,gen=None): #16khz pcm, 任意长度；gen 为写入方看到的缓冲代号
+        self.asr.put_audio_block(pcm, gen)
+
+    def audio_gen(self): #音频缓冲当前代号，打断后推进
+        return self.asr.ring.gen
+
+    def audio_backlog(self): #已写入、尚未被渲染取走的音频秒数
+        return self.asr.ring.available() / self.asr.sample_rate
+
     def pause_talk(self):
+        t = time.perf_counter()
         self.tts.pause_talk()
-        self.asr.pause_talk()
-
-    def process_frames(self,quit_event,loop=None,audio_track=None,video_track=None):
+        # 推进打断代号并在缓冲锁内清空音频、把缓冲代号设为新代号: 之后带旧代号的写入被丢弃，
+        # 两步之间读出的旧音频仍带旧代号，下游按代号换成静音
+        with self.epoch.get_lock():
+            self.epoch.value += 1
+            self.asr.pause_talk(self.epoch.value)
+            # 没有音频轨道时没有人在听，不计量
+            self.interrupted = (t, self.epoch.value) if self.audio_track is not None else None
+
+    def frame_sent(self, epoch):
+        """音频轨道每送出一帧回调一次: 打断后第一帧(新代号的语音或静音)送出即打断完成，计量打断耗时。"""
+        interrupted = self.interrupted
+        if interrupted is None or epoch < interrupted[1]:
+            return
+        self.interrupted = None
+        elapsed = time.perf_counter() - interrupted[0]
+        self.metrics.observe('interrupt', elapsed)
+        if elapsed > 0.1:
+            print(f"[WARN] 打断到静音耗时 {elapsed*1000:.0f}ms，超过100ms")
+
+    def process_frames(self,quit_event):
         while not quit_event.is_set():
             try:
-                res_frame,idx,audio_frames = self.res_frame_queue.get(block=True, timeout=1)
+                res_frame,idx,audio_frames,gen,epoch = self.res_frame_queue.get(block=True, timeout=1)
             except queue.Empty:
                 continue
-            if audio_frames[0][1]==1 and audio_frames[1][1]==1: 
-                combine_frame = self.frame_list_cycle[idx]
-            else:
-                bbox = self.coord_list_cycle[idx]
-                combine_frame = copy.deepcopy(self.frame_list_cycle[idx])
-                y1, y2, x1, x2 = bbox
-                try:
-                    res_frame = cv2.resize(res_frame.astype(np.uint8),(x2-x1,y2-y1))
-                except:
-                    continue
-                combine_frame[y1:y2, x1:x2] = res_frame
+            # 轨道随 WebRTC 连接挂上/摘下，每帧取当前的
+            loop, audio_track, video_track = self.loop, self.audio_track, self.video_track
+            if gen != self.avatar_gen:
+                self.__swap_avatar(gen)
+            slot = None
+            if isinstance(res_frame, tuple):
+                slot, shape = res_frame
+                res_frame = self.frame_ring.view(slot, shape)
+            pcm, types = audio_frames
+            if epoch != self.epoch.value:
+                # 打断前的帧: 口型和声音都丢弃，按原avatar帧和静音继续出帧，保持时间线连续
+                res_frame, pcm, types, epoch = None, np.zeros_like(pcm), np.ones_like(types), self.epoch.value
+            # 没有轨道消费的帧(连接断开时队列里剩下的)不合成、不打包，只归还帧环槽位
+            video_out = loop is not None and getattr(video_track, '_queue', None) is not None
+            audio_out = loop is not None and getattr(audio_track, '_queue', None) is not None
+            try:
+                if video_out:
+                    with self.metrics.timer('composite'):
+                        if res_frame is None or is_silence(types): 
+                            # 静音帧(整批或逐帧跳过推理)直接用原avatar帧
+                            new_frame = self.compositor.compose(self.frame_list_cycle[idx])
+                        else:
+                            new_frame = self.compositor.compose(self.frame_list_cycle[idx], res_frame, self.coord_list_cycle[idx])
+            except Exception:
+                continue
+            finally:
+                if slot is not None:
+                    self.frame_ring.release(slot)
+
+            if video_out:
+                asyncio.run_coroutine_threadsafe(video_track.put_frame(new_frame, epoch), loop) 
+            if audio_out:
+                for frame in (pcm * 32767).astype(np.int16):
+                    new_frame = AudioFrame(format='s16', layout='mono', samples=frame.shape[0])
+                    new_frame.planes[0].update(frame.tobytes())
+                    new_frame.sample_rate=16000
+                    asyncio.run_coroutine_threadsafe(audio_track.put_frame(new_frame, epoch), loop)
+        print('musereal process_frames thread stop') 
 
-            image = combine_frame 
-            new_frame = VideoFrame.from_ndarray(image, format="bgr24")
+    def queue_depths(self):
+        """各队列当前深度，供 /metrics 采样。"""
+        depths = {
+            'asr_audio': self.asr.ring.frames_available(),
+            'feat': qsize(self.channel.feat_queue),
+            'res_frame': qsize(self.res_frame_queue),
+        }
+        for name, track in (('webrtc_video', self.video_track), ('webrtc_audio', self.audio_track)):
+            if track is not None and getattr(track, '_queue', None) is not None:
+                depths[name] = track._queue.qsize()
+        return depths
+
+    def __track_backlog(self):
+        """视频或音频轨道队列积压超过两个batch的媒体时返回 True。"""
+        for track, limit in ((self.video_track, self.batch_size * 2), (self.audio_track, self.batch_size * 4)):
+            if track is not None and getattr(track, '_queue', None) is not None and track._queue.qsize() > limit:
+                return True
+        return False
+
+    def __sync_tracks_event(self):
+        if self.audio_track is not None or self.video_track is not None:
+            self.tracks_event.set()
+        else:
+            self.tracks_event.clear()
 
-            if video_track is not None and hasattr(video_track, '_queue') and video_track._queue is not None and loop is not None:
-                asyncio.run_coroutine_threadsafe(video_track._queue.put(new_frame), loop) 
-            else:
-                # print("[Warning] video_track 或其 _queue 未初始化，跳过视频帧发送")
-                pass
-            for audio_frame in audio_frames:
-                frame,type = audio_frame
-                frame = (frame * 32767).astype(np.int16)
-                new_frame = AudioFrame(format='s16', layout='mono', samples=frame.shape[0])
-                new_frame.planes[0].update(frame.tobytes())
-                new_frame.sample_rate=16000
-
-                if audio_track is not None and hasattr(audio_track, '_queue') and audio_track._queue is not None and loop is not None:
-                    asyncio.run_coroutine_threadsafe(audio_track._queue.put(new_frame), loop)
-                else:
-                    # print("[Warning] audio_track 或其 _queue 未初始化，跳过音频帧发送")
-                    pass
-        print('musereal process_frames thread stop') 
+    def __detach_tracks(self, audio_track, video_track):
+        with self.render_lock:
+            if audio_track is not None and self.audio_track is audio_track:
+                self.audio_track = None
+            if video_track is not None and self.video_track is video_track:
+                self.video_track = None
+            self.__sync_tracks_event()
 
     def render(self,quit_event,loop=None,audio_track=None,video_track=None):
+        # 每个会话只运行一个渲染循环(ASR步进、推理、process_frames)，否则音频按倍速消耗、流式mel状态被并发修改。
+        # 已有循环在运行时，后来的调用(WebRTC 连接)只挂上自己的轨道，quit_event 置位(连接断开)时摘下后返回。
+        # 渲染循环退出即会话结束，共享内存帧环随之释放
+        if self.frame_ring.closed:
+            print('[WARN] 会话渲染循环已结束，不能再次渲染')
+            return
+        with self.render_lock:
+            if audio_track is not None or video_track is not None:
+                self.loop, self.audio_track, self.video_track = loop, audio_track, video_track
+                self.__sync_tracks_event()
+            owner = self.render_quit is None or self.render_quit.is_set()
+            if owner:
+                self.render_quit = quit_event
+        if not owner:
+            quit_event.wait()
+            self.__detach_tracks(audio_track, video_track)
+            return
+        try:
+            self.__render_loop(quit_event)
+        finally:
+            self.__detach_tracks(audio_track, video_track)
+
+    def __render_loop(self, quit_event):
             self.tts.render(quit_event)
-            process_thread = Thread(target=self.process_frames, args=(quit_event,loop,audio_track,video_track))
+            process_thread = Thread(target=self.process_frames, args=(quit_event,))
             process_thread.start()
 
+            # 每步消耗 batch*2 个音频帧，按媒体时钟一个batch周期执行一步
+            clock = RenderClock(self.batch_size * 2 / self.fps)
             self.render_event.set() #start infer process render
-            count=0
-            totaltime=0
-            _starttime=time.perf_counter()
             while not quit_event.is_set(): 
+                if not self.tracks_event.is_set():
+                    # 没有轨道(还没有连接或连接已断开): 不步进ASR、不推理、不合成，空闲会话几乎不占CPU。
+                    # 音频推流不受 TTS 那样的积压限速，缓冲只保留最近 idle_backlog 秒，
+                    # 等到有连接挂上轨道，媒体时钟顺延
+                    self.render_event.clear() #pause infer process render
+                    t = time.perf_counter()
+                    while not self.tracks_event.wait(0.1) and not quit_event.is_set():
+                        self.asr.ring.trim(self.idle_backlog * self.asr.sample_rate)
+                    clock.stall(time.perf_counter() - t)
+                    self.render_event.set()
+                    continue
+                clock.wait(quit_event)
+                # 下游背压: 轨道队列积压时等待消费，期间媒体时钟顺延
                 t = time.perf_counter()
-                self.asr.run_step()
-                if video_track is not None and hasattr(video_track, '_queue') and video_track._queue is not None:
-                    if video_track._queue.qsize()>=5:
-                        print('sleep qsize=',video_track._queue.qsize())
-                        time.sleep(0.04*video_track._queue.qsize()*0.8)
-                else:
-                    # print("[Warning] video_track 或其 _queue 未初始化，跳过睡眠调节")
+                while self.__track_backlog() and not quit_event.wait(clock.period / 8):
                     pass
+                clock.stall(time.perf_counter() - t)
+                if quit_event.is_set():
+                    break
+                self.asr.run_step()
+                clock.tick()
             self.render_event.clear() #end infer process render
+            process_thread.join()
+            self.frame_ring.close()
             print('musereal thread stop')
 
     def reload_avatar(self):
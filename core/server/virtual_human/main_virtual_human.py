@@ -52,6 +52,8 @@ from threading import Event, Thread, Lock
 from webrtc.webrtc import HumanPlayer
 
 import lipreal
+from metrics import render_prometheus
+from tts.speechcache import cache_stats
 OriginalLipReal = lipreal.LipReal  
 
 import websocket_service
@@ -123,6 +125,9 @@ def parse_args():
     parser.add_argument('--REF_FILE',    type=str, default=None, help='参考音频文件路径')
     parser.add_argument('--REF_TEXT',    type=str, default=None, help='参考文本')
     parser.add_argument('--TTS_SERVER',  type=str, default=None, help='TTS服务器地址')
+    parser.add_argument('--tts_lookahead', type=float, default=3.0, help='TTS按句合成最多领先播放的音频秒数')
+    parser.add_argument('--tts_cache_dir', type=str, default='data/tts_cache', help='合成语音缓存目录，空字符串关闭缓存')
+    parser.add_argument('--tts_cache_mb',  type=int, default=256, help='合成语音缓存磁盘上限(MB)')
 
     parser.add_argument('--pose',        type=str, default="data/data_kf.json", help="transforms.json, pose source")
     parser.add_argument('--au',          type=str, default="data/au.csv",       help="eye blink area")
@@ -209,6 +214,13 @@ def parse_args():
     parser.add_argument('--transport',      type=str, default='rtcpush')
     parser.add_argument('--push_url',       type=str, default='http://192.168.1.2:1985/rtc/v1/whip/?app=live&stream=livestream')
     parser.add_argument('--max_session',    type=int, default=1)
+    parser.add_argument('--infer_engine',   type=str, default='eager', choices=['eager', 'torchscript', 'onnx', 'int8'],
+                        help='Wav2Lip推理引擎，转换结果缓存在wav2lip.pth旁')
+    parser.add_argument('--channels_last',  action='store_true',
+                        help='eager/torchscript 引擎使用 channels_last 内存布局')
+    parser.add_argument('--shared_infer',   action='store_true', help='所有会话共用一个跨会话合批的Wav2Lip推理服务')
+    parser.add_argument('--infer_max_batch', type=int, default=64, help='共享推理服务单次推理的最大帧数')
+    parser.add_argument('--infer_max_delay', type=float, default=20, help='共享推理服务请求最长排队时间(ms)')
     parser.add_argument('--listenport',     type=int, default=8010)
 
     return parser.parse_args()
@@ -268,6 +280,7 @@ logger.debug(f"初始化Redis连接: {redis_cfg.get('host', 'localhost')}:{redis
 
 nerfreals = {}
 statreals = {}
+infer_server = None
 
 def redis_publish(channel, message):    r.publish(channel, message)
 def redis_lpush(queue_name, message):  r.lpush(queue_name, message)
@@ -339,7 +352,7 @@ async def offer(request):
             sessionid = str(len(nerfreals))
             logger.debug(f"[API] 创建新会话，sessionid: {sessionid}")
             
-            nerfreals[sessionid] = LipReal(opt)
+            nerfreals[sessionid] = LipReal(opt, infer_server)
 
             quit_event = Event()
             t_render = Thread(target=nerfreals[sessionid].render, args=(quit_event,), daemon=True)
@@ -459,6 +472,16 @@ async def api_interrupt_speaking(request):
         return web.json_response({'error': f'打断失败: {e}'}, status=500)
 
 
+async def metrics(request):
+    # Prometheus 文本格式的分阶段耗时直方图与队列深度
+    sessions = {}
+    for sessionid, nerfreal in list(nerfreals.items()):
+        if getattr(nerfreal, 'metrics', None) is not None:
+            sessions[sessionid] = (nerfreal.metrics, nerfreal.queue_depths())
+    return web.Response(text=render_prometheus(sessions, cache_stats()),
+                        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+
 # 音频流处理
 SAMPLE_RATE = 16000
 CHANNELS = 1
@@ -486,13 +509,10 @@ async def audio_stream_in(request: web.Request):
             logger.warning(f"[API] /audio_stream_in 数据长度不是{FRAME_BYTES}的倍数")
             return web.json_response({"code": 3, "msg": f"长度需{FRAME_BYTES}字节整数倍"}, status=400)
         
-        audio_int16 = np.frombuffer(body, dtype=np.int16).reshape(-1, FRAME_SAMPLES)
-        frame_count = audio_int16.shape[0]
-        logger.debug(f"[API] /audio_stream_in 解析到 {frame_count} 帧音频")
+        logger.debug(f"[API] /audio_stream_in 解析到 {len(body) // FRAME_BYTES} 帧音频")
         
-        for idx, frame_int16 in enumerate(audio_int16):
-            af = frame_int16.astype(np.float32) / 32768.0
-            nerfreals[sessionid].put_audio_frame(af)
+        # 整个请求体一次转换并写入ASR缓冲
+        nerfreals[sessionid].put_audio_block(np.frombuffer(body, dtype=np.int16))
         
         logger.debug(f"[API] /audio_stream_in 处理完成")
         return web.json_response({"code": 0, "msg": "接收成功"})
@@ -511,15 +531,11 @@ def audio_data_processing(audio_queue):
             _ws_session, raw_bytes = audio_queue.get()
             audio_int16 = np.frombuffer(raw_bytes, dtype=np.int16)
             num_frames = len(audio_int16) // FRAME_SAMPLES
-            audio_int16 = audio_int16[: num_frames * FRAME_SAMPLES]
-            frames = audio_int16.reshape(num_frames, FRAME_SAMPLES)
             
-            for frame in frames:
-                audio_frame = frame.astype(np.float32) / 32768.0
-                if '0' in nerfreals:
-                    nerfreals['0'].put_audio_frame(audio_frame)
-                else:
-                    logger.warning("[AudioProc] 没有找到 session '0'")
+            if '0' in nerfreals:
+                nerfreals['0'].put_audio_block(audio_int16[: num_frames * FRAME_SAMPLES])
+            else:
+                logger.warning("[AudioProc] 没有找到 session '0'")
                     
             audio_queue.task_done()
         except Exception as e:
@@ -583,8 +599,8 @@ lock_avatar_switch = Lock()
 
 
 class LipReal(OriginalLipReal):
-    def __init__(self, opt):
-        super().__init__(opt)
+    def __init__(self, opt, infer_server=None):
+        super().__init__(opt, infer_server)
         self.avatar_dir = None
         logger.debug(f"[LipReal] 初始化实例，使用avatar_id: {opt.avatar_id}")
 
@@ -629,6 +645,7 @@ appasync.router.add_static(
 appasync.router.add_post("/audio_stream_in", audio_stream_in)
 appasync.router.add_post("/api/switch_avatar", lambda request: butler.api_switch_avatar(request, r, BUTLER_FOLDER_MAP))
 appasync.router.add_post("/api/interrupt_speaking", api_interrupt_speaking)
+appasync.router.add_get("/metrics", metrics)
 
 appasync.router.add_post(
     "/api/make_human", 
@@ -885,16 +902,23 @@ if __name__ == '__main__':
     ws_proc.start()
     logger.debug(f"启动WebSocket服务进程，PID: {ws_proc.pid}")
 
+    quit_events = {}
+    render_threads = {}
     if opt.model == 'wav2lip':
         logger.debug(f"初始化wav2lip模型，最大会话数: {opt.max_session}")
+        if opt.shared_infer:
+            infer_server = lipreal.LipInferServer(opt)
+            logger.debug(f"启动共享推理服务进程，PID: {infer_server.process.pid}")
         for i in range(opt.max_session):
             sessionid = str(i)
-            nerfreal = LipReal(opt)
+            nerfreal = LipReal(opt, infer_server)
             nerfreals[sessionid] = nerfreal
 
             quit_event = Event()
+            quit_events[sessionid] = quit_event
             t_render = Thread(target=nerfreals[sessionid].render, args=(quit_event,), daemon=True)
             t_render.start()
+            render_threads[sessionid] = t_render
             logger.debug(f"启动渲染线程，sessionid: {sessionid}, 线程ID: {t_render.ident}")
 
             t_redis = Thread(target=redis_msg_consumer, args=(sessionid,), daemon=True)
@@ -918,22 +942,8 @@ if __name__ == '__main__':
     logger.debug(f"启动LLM线程，线程ID: {llm_thread.ident}")
 
     
-    quit_events = {}
-    render_threads = {}
     redis_consumer_threads = {}
     for sessionid in nerfreals.keys():
-        quit_event = Event()
-        quit_events[sessionid] = quit_event
-
-        t_render = Thread(
-            target=nerfreals[sessionid].render,
-            args=(quit_event,),
-            daemon=True
-        )
-        t_render.start()
-        render_threads[sessionid] = t_render
-        logger.debug(f"启动渲染线程，sessionid: {sessionid}, 线程ID: {t_render.ident}")
-
         t_redis = Thread(
             target=redis_msg_consumer,
             args=(sessionid,),
@@ -966,6 +976,8 @@ if __name__ == '__main__':
             ws_proc.join(timeout=2.0)
             logger.debug("WebSocket服务进程已终止")
             
+        for quit_event in quit_events.values():
+            quit_event.set()
         for thread in render_threads.values():
             thread.join(1)
             
@@ -0,0 +1,99 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from multiprocessing.sharedctypes import RawArray
+
+# 渲染链路各阶段: mel特征提取、模型推理、整帧合成、WebRTC 轨道队列等待(入队到 recv 取出)、
+# TTS 首包音频耗时、TTS 请求首字节(响应头)耗时、打断到合成停止、打断到输出静音(第一帧打断后的音频入轨道)
+STAGES = ('mel', 'infer', 'composite', 'webrtc_video', 'webrtc_audio', 'tts_ttfa', 'tts_ttfb', 'tts_cancel', 'interrupt')
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.04, 0.08, 0.16, 0.32, 0.64, 1.28, 2.56)
+
+_STAGE_INDEX = {stage: i for i, stage in enumerate(STAGES)}
+
+
+class StageMetrics:
+    """
+    单个会话的分阶段耗时直方图。
+    计数放在共享内存(RawArray)里，推理子进程或共享推理服务写入的数据父进程的 /metrics 直接可读。
+    每个阶段只有一个写者(ASR线程、推理进程、process_frames线程、事件循环)，因此不加锁。
+    """
+
+    def __init__(self):
+        self.width = len(BUCKETS) + 1  # 最后一格为 +Inf
+        self.buckets = RawArray('Q', len(STAGES) * self.width)
+        self.sums = RawArray('d', len(STAGES))
+        self.counts = RawArray('Q', len(STAGES))
+
+    def observe(self, stage, seconds):
+        s = _STAGE_INDEX[stage]
+        self.buckets[s * self.width + bisect_left(BUCKETS, seconds)] += 1
+        self.sums[s] += seconds
+        self.counts[s] += 1
+
+    @contextmanager
+    def timer(self, stage):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t)
+
+    def histogram(self, stage):
+        """返回 (累积桶计数列表, 总和, 次数)，桶与 BUCKETS 一一对应，最后一个为 +Inf。"""
+        s = _STAGE_INDEX[stage]
+        cumulative, total = [], 0
+        for b in range(self.width):
+            total += self.buckets[s * self.width + b]
+            cumulative.append(total)
+        return cumulative, self.sums[s], self.counts[s]
+
+
+def qsize(q):
+    """队列深度；macOS 上 mp.Queue.qsize 未实现时返回 None。"""
+    try:
+        return q.qsize()
+    except NotImplementedError:
+        return None
+
+
+def render_prometheus(sessions, tts_cache=None):
+    """
+    把各会话的指标渲染成 Prometheus 文本格式。
+    sessions: {sessionid: (StageMetrics, {队列名: 深度})}
+    tts_cache: {缓存目录: SpeechCache.stats()}
+    """
+    lines = [
+        '# HELP virtual_human_stage_seconds Latency of each stage of the virtual-human render path.',
+        '# TYPE virtual_human_stage_seconds histogram',
+    ]
+    for sessionid, (metrics, _) in sessions.items():
+        for stage in STAGES:
+            cumulative, total, count = metrics.histogram(stage)
+            labels = f'session="{sessionid}",stage="{stage}"'
+            for le, value in zip(BUCKETS + ('+Inf',), cumulative):
+                lines.append(f'virtual_human_stage_seconds_bucket{{{labels},le="{le}"}} {value}')
+            lines.append(f'virtual_human_stage_seconds_sum{{{labels}}} {total:.6f}')
+            lines.append(f'virtual_human_stage_seconds_count{{{labels}}} {count}')
+    lines += [
+        '# HELP virtual_human_queue_depth Items waiting in each queue of the virtual-human render path.',
+        '# TYPE virtual_human_queue_depth gauge',
+    ]
+    for sessionid, (_, depths) in sessions.items():
+        for name, depth in depths.items():
+            if depth is not None:
+                lines.append(f'virtual_human_queue_depth{{session="{sessionid}",queue="{name}"}} {depth}')
+    if tts_cache:
+        lines += [
+            '# HELP virtual_human_tts_cache_lookups_total Synthesized-speech cache lookups by result.',
+            '# TYPE virtual_human_tts_cache_lookups_total counter',
+        ]
+        for root, stats in tts_cache.items():
+            for result, field in (('hit', 'hits'), ('miss', 'misses')):
+                lines.append(f'virtual_human_tts_cache_lookups_total{{cache="{root}",result="{result}"}} {stats[field]}')
+        lines += [
+            '# HELP virtual_human_tts_cache_hit_ratio Fraction of synthesized-speech cache lookups that hit.',
+            '# TYPE virtual_human_tts_cache_hit_ratio gauge',
+        ]
+        for root, stats in tts_cache.items():
+            lines.append(f'virtual_human_tts_cache_hit_ratio{{cache="{root}"}} {stats["hit_rate"]:.4f}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,44 @@
+import time
+
+
+class RenderClock:
+    """
+    渲染循环的媒体时钟：每一步产出 period 秒的媒体，按墙钟节拍推进。
+    最多领先墙钟 lead 秒(给推理/合成流水线留余量)，领先更多时睡眠；
+    落后时不睡眠连续追赶，落后超过 max_lag 秒(推理卡顿等)则放弃欠账重新对齐，避免突发补帧。
+    下游背压期间调用 stall() 把时钟整体后移，背压解除后不会补跑。
+    """
+
+    def __init__(self, period, lead=None, max_lag=None):
+        self.period = period
+        self.lead = period if lead is None else lead
+        self.max_lag = 2 * period if max_lag is None else max_lag
+        self.start = None  # 媒体时间0对应的墙钟时刻
+        self.media = 0.  # 已产出的媒体时长
+
+    def ahead(self):
+        """已产出的媒体领先墙钟的秒数，负数表示落后。"""
+        if self.start is None:
+            return 0.
+        return self.start + self.media - time.perf_counter()
+
+    def wait(self, quit_event=None):
+        """等到下一步可以执行；quit_event 置位时提前返回。"""
+        if self.start is None:
+            self.start = time.perf_counter()
+            return
+        ahead = self.ahead()
+        if ahead > self.lead:
+            if quit_event is not None:
+                quit_event.wait(ahead - self.lead)
+            else:
+                time.sleep(ahead - self.lead)
+        elif ahead < -self.max_lag:
+            self.start -= ahead
+
+    def tick(self):
+        self.media += self.period
+
+    def stall(self, seconds):
+        if self.start is not None:
+            self.start += seconds
@@ -9,7 +9,6 @@ import cv2
 import glob
 import pickle
 import copy
-import resampy
 
 import queue
 from queue import Queue
@@ -21,6 +20,7 @@ import av
 from fractions import Fraction
 
 from ttsreal import VoitsTTS, XTTS
+from tts.resampler import resample
 
 from tqdm import tqdm
 
@@ -69,15 +69,20 @@ class BaseReal:
     def put_audio_frame(self, audio_chunk):  # 16khz 20ms pcm
         self.asr.put_audio_frame(audio_chunk)
 
+    def put_audio_block(self, pcm, gen=None):  # 16khz pcm, 任意长度；gen 为写入方看到的缓冲代号
+        self.asr.put_audio_block(pcm, gen)
+
+    def audio_gen(self):  # 音频缓冲当前代号，打断后推进
+        return self.asr.ring.gen
+
+    def audio_backlog(self):  # 已写入、尚未被渲染取走的音频秒数
+        return self.asr.ring.available() / self.asr.sample_rate
+
     def put_audio_file(self, filebyte): 
         input_stream = BytesIO(filebyte)
         stream = self.__create_bytes_stream(input_stream)
-        streamlen = stream.shape[0]
-        idx = 0
-        while streamlen >= self.chunk:  # and self.state==State.RUNNING
-            self.put_audio_frame(stream[idx:idx+self.chunk])
-            streamlen -= self.chunk
-            idx += self.chunk
+        # 整段一次写入，末尾不足一帧的采样丢弃
+        self.put_audio_block(stream[:stream.shape[0] // self.chunk * self.chunk])
     
     def __create_bytes_stream(self, byte_stream):
         # byte_stream=BytesIO(buffer)
@@ -91,7 +96,7 @@ class BaseReal:
     
         if sample_rate != self.sample_rate and stream.shape[0] > 0:
             print(f'[WARN] audio sample rate is {sample_rate}, resampling into {self.sample_rate}.')
-            stream = resampy.resample(x=stream, sr_orig=sample_rate, sr_new=self.sample_rate)
+            stream = resample(stream, sample_rate, self.sample_rate)
 
         return stream
 
@@ -0,0 +1,62 @@
+import socket
+import time
+from threading import Event, Lock
+
+
+class CancelToken:
+    """
+    一次合成的取消令牌：打断时 cancel()，合成线程轮询 cancelled，
+    on_cancel 注册的回调(关闭 HTTP 响应、取消协程等)在 cancel 时立即执行，阻塞中的读取也能马上返回。
+    已取消的令牌上注册回调会立刻执行。
+    """
+
+    def __init__(self):
+        self.event = Event()
+        self.lock = Lock()
+        self.callbacks = []
+        self.cancelled_at = None
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def on_cancel(self, fn):
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(fn)
+                return
+        fn()
+
+    def forget(self):
+        """丢弃已注册的回调(对应的请求已经结束)，避免长时间不打断时回调越积越多。"""
+        with self.lock:
+            self.callbacks = []
+
+    def cancel(self):
+        with self.lock:
+            if self.event.is_set():
+                return
+            self.cancelled_at = time.perf_counter()
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                print(f'[WARN] cancel callback failed: {e}')
+
+
+def abort_response(res):
+    """
+    中止 requests 的流式响应：先 shutdown 底层 socket，另一线程里阻塞的 recv 立即返回，再关闭响应。
+    断开的连接不会被连接池复用(取出时检测到已断开会重新建连)。
+    底层 socket 取自 urllib3 的私有属性，取不到(版本差异、响应已释放连接)时只关闭响应。
+    """
+    conn = getattr(getattr(res, 'raw', None), '_connection', None)
+    sock = getattr(conn, 'sock', None)
+    if isinstance(sock, socket.socket):
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    res.close()
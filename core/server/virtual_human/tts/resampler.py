@@ -0,0 +1,124 @@
+import functools
+from math import gcd, ceil
+
+import numpy as np
+
+
+@functools.lru_cache(maxsize=None)
+def polyphase_filter(sr_in, sr_out, num_zeros=16, rolloff=0.945, beta=8.6):
+    """
+    按采样率对预先设计 Kaiser 窗 sinc 低通并拆成多相矩阵。
+    返回 (up, down, delay, poly)：poly[p, j] 是第 p 相的第 j 个系数，delay 为上采样域的半滤波器长度。
+    """
+    g = gcd(sr_in, sr_out)
+    up, down = sr_out // g, sr_in // g
+    factor = max(up, down)
+    delay = int(ceil(num_zeros * factor / rolloff))
+    k = np.arange(-delay, delay + 1, dtype=np.float64)
+    cutoff = rolloff / factor  # 相对上采样域奈奎斯特频率
+    h = cutoff * np.sinc(cutoff * k) * np.kaiser(len(k), beta) * up
+    taps = int(ceil(len(h) / up))
+    h = np.concatenate((h, np.zeros(taps * up - len(h))))
+    poly = np.ascontiguousarray(h.reshape(taps, up).T)
+    return up, down, delay, poly
+
+
+class StreamResampler:
+    """
+    有状态的流式多相重采样：滤波器按采样率对缓存，块与块之间保留输入历史，
+    分块处理再 flush 的结果与整段一次处理完全一致，块边界没有不连续。
+    输出与输入零相位对齐(输出第 n 个采样对应输入时刻 n*sr_in/sr_out)，只需极少量前瞻。
+    """
+
+    def __init__(self, sr_in, sr_out):
+        self.sr_in = sr_in
+        self.sr_out = sr_out
+        self.up, self.down, self.delay, self.poly = polyphase_filter(sr_in, sr_out)
+        self.taps = self.poly.shape[1]
+        self.reset()
+
+    def reset(self):
+        self.hist = np.zeros(self.taps - 1, dtype=np.float64)
+        self.n_in = 0  # 已输入的采样数
+        self.n_out = 0  # 已输出的采样数
+
+    def process(self, x):
+        """送入一块输入，返回目前能确定的全部输出 (float32)。"""
+        x = np.asarray(x, dtype=np.float64).reshape(-1)
+        if self.up == self.down:
+            return x.astype(np.float32)
+        ext = np.concatenate((self.hist, x))
+        n_total = self.n_in + len(x)
+        # 输出 n 需要输入下标 (n*down + delay)//up 已到达
+        n_end = max(self.n_out, (n_total * self.up - 1 - self.delay) // self.down + 1)
+        t = np.arange(self.n_out, n_end, dtype=np.int64) * self.down + self.delay
+        local = t // self.up - (self.n_in - (self.taps - 1))
+        window = ext[local[:, None] - np.arange(self.taps)]
+        y = (self.poly[t % self.up] * window).sum(axis=1)
+        self.hist = ext[len(ext) - (self.taps - 1):]
+        self.n_in = n_total
+        self.n_out = n_end
+        return y.astype(np.float32)
+
+    def flush(self):
+        """输入结束：补零取出剩余输出，总长为 floor(n_in*sr_out/sr_in)，随后重置状态。"""
+        if self.up == self.down:
+            self.reset()
+            return np.zeros(0, dtype=np.float32)
+        expected = self.n_in * self.up // self.down
+        tail = self.process(np.zeros(self.delay // self.up + 2))
+        tail = tail[:max(0, len(tail) - (self.n_out - expected))]
+        self.reset()
+        return tail
+
+
+class SegmentResampler:
+    """
+    把解码器产出的 [(pcm, 采样率)] 段统一转换到 sr_out：采样率不同时才在第一段建 StreamResampler，
+    之后各段共用它、块间保留滤波状态；与 sr_out 相同的段原样输出。
+    """
+
+    def __init__(self, sr_out):
+        self.sr_out = sr_out
+        self.resampler = None
+
+    def process(self, segments):
+        for stream, sample_rate in segments:
+            if self.resampler is None and sample_rate != self.sr_out:
+                self.resampler = StreamResampler(sample_rate, self.sr_out)
+            yield stream if self.resampler is None else self.resampler.process(stream)
+
+    def flush(self):
+        """输入结束：取出重采样的剩余输出，没有重采样时为空。"""
+        if self.resampler is None:
+            return np.zeros(0, dtype=np.float32)
+        return self.resampler.flush()
+
+
+def resample(x, sr_in, sr_out):
+    """整段重采样，与分块流式处理结果一致。"""
+    if sr_in == sr_out:
+        return np.asarray(x, dtype=np.float32)
+    resampler = StreamResampler(sr_in, sr_out)
+    return np.concatenate((resampler.process(x), resampler.flush()))
+
+
+if __name__ == '__main__':
+    # 按20ms分块重采样的耗时对比(分块与整段一致性的检查见 tests/test_resampler.py)
+    import time
+
+    import resampy
+
+    for sr_in in (22050, 24000, 32000, 44100, 48000):
+        x = (0.3 * np.sin(2 * np.pi * 440 * np.arange(sr_in * 3) / sr_in)).astype(np.float32)
+        blocks = np.split(x, np.arange(sr_in // 50, len(x), sr_in // 50))
+        begin = time.perf_counter()
+        for b in blocks:
+            resampy.resample(b, sr_in, 16000)
+        per_chunk = time.perf_counter() - begin
+        stream = StreamResampler(sr_in, 16000)
+        begin = time.perf_counter()
+        for b in blocks:
+            stream.process(b)
+        stream.flush()
+        print(f'{sr_in:>6} -> 16000  20ms chunks: resampy {per_chunk * 1000:.1f}ms, stream {(time.perf_counter() - begin) * 1000:.1f}ms')
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_text(text):
+    """全半角统一、去掉首尾空白并合并连续空白，作为缓存键的文本部分。"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+def voice_id(*parts):
+    """音色标识：参考音频路径附带其大小和修改时间，替换同名参考音频后旧缓存自然失效。"""
+    ident = []
+    for part in parts:
+        part = '' if part is None else str(part)
+        if part and os.path.isfile(part):
+            st = os.stat(part)
+            part = f'{part}:{st.st_size}:{st.st_mtime_ns}'
+        ident.append(part)
+    return '|'.join(ident)
+
+
+class SpeechCache:
+    """
+    合成语音缓存：按 (后端, 音色, 规范化文本) 的哈希存 16khz float32 pcm。
+    磁盘上每条一个 .npy 文件，读取时内存映射；内存里只保留最近使用的 max_items 个映射(LRU)，
+    磁盘总量超过 max_bytes 时按最近使用时间淘汰。写入先写临时文件再改名，多进程共享目录也不会读到半个文件。
+    """
+
+    def __init__(self, root, max_bytes=256 << 20, max_items=256):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.lru = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(backend, voice, text):
+        return hashlib.sha1(f'{backend}\0{voice}\0{normalize_text(text)}'.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key + '.npy')
+
+    def get(self, key):
+        """命中返回只读的内存映射数组，未命中返回 None。"""
+        with self.lock:
+            pcm = self.lru.get(key)
+            if pcm is not None:
+                self.lru.move_to_end(key)
+                self.hits += 1
+                return pcm
+        path = self._path(key)
+        try:
+            pcm = np.load(path, mmap_mode='r')
+            os.utime(path)  # 记录最近使用时间，供磁盘淘汰
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.lru[key] = pcm
+            while len(self.lru) > self.max_items:
+                self.lru.popitem(last=False)
+            self.hits += 1
+        return pcm
+
+    def put(self, key, pcm):
+        pcm = np.ascontiguousarray(pcm, dtype=np.float32)
+        if len(pcm) == 0 or pcm.nbytes > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                np.save(f, pcm)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f'[WARN] tts cache write failed: {e}')
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith('.npy'):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path, entry.name[:-4]))
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, path, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)  # 已映射的数组在 POSIX 上仍可继续读
+            except OSError:
+                continue
+            total -= size
+            with self.lock:
+                self.lru.pop(key, None)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate(), 'items': len(self.lru)}
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def speech_cache(root, max_bytes=256 << 20):
+    """进程内同一目录共用一个缓存实例(各会话的 TTS 共享命中统计和 LRU)。"""
+    with _caches_lock:
+        cache = _caches.get(root)
+        if cache is None:
+            cache = _caches[root] = SpeechCache(root, max_bytes)
+        return cache
+
+
+def cache_stats():
+    """进程内各缓存目录的命中统计，供 /metrics 输出。"""
+    with _caches_lock:
+        return {root: cache.stats() for root, cache in _caches.items()}
+
@@ -0,0 +1,152 @@
+import io
+
+import av
+import numpy as np
+import soundfile as sf
+
+
+class FrameChunker:
+    """把任意长度的音频块整理成整数个 chunk 采样的帧，不足一帧的尾巴留到下一块，flush 时补零发出。"""
+
+    def __init__(self, chunk):
+        self.chunk = chunk
+        self.carry = np.zeros(0, dtype=np.float32)
+
+    def push(self, samples):
+        samples = np.concatenate((self.carry, np.asarray(samples, dtype=np.float32).reshape(-1)))
+        n = len(samples) // self.chunk * self.chunk
+        self.carry = samples[n:]
+        return samples[:n]
+
+    def flush(self):
+        if len(self.carry) == 0:
+            return self.carry
+        tail = np.zeros(self.chunk, dtype=np.float32)
+        tail[:len(self.carry)] = self.carry
+        self.carry = np.zeros(0, dtype=np.float32)
+        return tail
+
+
+class PcmDecoder:
+    """裸 int16 小端 PCM 流：网络块可能在采样中间断开，奇数字节留到下一块。"""
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.carry = b''
+
+    def feed(self, data):
+        data = self.carry + data
+        n = len(data) // 2 * 2
+        self.carry = data[n:]
+        return np.frombuffer(data[:n], dtype='<i2').astype(np.float32) / 32767
+
+    def flush(self):
+        self.carry = b''
+        return np.zeros(0, dtype=np.float32)
+
+
+_OGG_CAPTURE = b'OggS'
+_OGG_EOS = 0x04
+
+
+class OggDecoder:
+    """
+    增量 Ogg(Vorbis/Opus) 解码：按页头把字节流重新切成完整的页，
+    一个逻辑流的 EOS 页到齐后整段交给 libsndfile 解码(采样精确)，从不把半个页或半个文件当作完整文件解码。
+    服务端逐段发送的链式 Ogg(每段一个完整文件)因此每段一到就能出声。
+    feed/flush 返回 [(pcm float32 单声道, 采样率)]。
+    """
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.scan = 0  # 下一个待解析页在 buf 中的位置，buf[:scan] 属于尚未结束的逻辑流
+
+    def feed(self, data):
+        self.buf += data
+        out = []
+        while True:
+            start = self.buf.find(_OGG_CAPTURE, self.scan)
+            if start < 0:
+                # 保留可能是半个捕获码的末尾几个字节
+                keep = max(self.scan, len(self.buf) - 3)
+                del self.buf[self.scan:keep]
+                break
+            if start > self.scan:
+                del self.buf[self.scan:start]  # 丢弃页间的垃圾字节
+            if len(self.buf) < self.scan + 27:
+                break
+            header_type = self.buf[self.scan + 5]
+            nsegs = self.buf[self.scan + 26]
+            if len(self.buf) < self.scan + 27 + nsegs:
+                break
+            body = sum(self.buf[self.scan + 27:self.scan + 27 + nsegs])
+            end = self.scan + 27 + nsegs + body
+            if len(self.buf) < end:
+                break
+            self.scan = end
+            if header_type & _OGG_EOS:
+                out += self._decode(bytes(self.buf[:end]))
+                del self.buf[:end]
+                self.scan = 0
+        return out
+
+    def flush(self):
+        """流结束：没有 EOS 的残留页尽量解码。"""
+        data = bytes(self.buf[:self.scan])
+        self.buf = bytearray()
+        self.scan = 0
+        return self._decode(data) if data else []
+
+    @staticmethod
+    def _decode(data):
+        try:
+            stream, sample_rate = sf.read(io.BytesIO(data), dtype='float32')
+        except Exception as e:
+            print(f"Error reading audio stream: {e}")
+            return []
+        if stream.ndim > 1:
+            stream = stream[:, 0]
+        return [(stream, sample_rate)]
+
+
+class Mp3Decoder:
+    """
+    增量 MP3 解码：用 ffmpeg 的码流解析器按帧切分，解码器跨块保留比特池状态，
+    每个完整的 MP3 帧到达即可解码出声，不必等整段合成结束。
+    feed/flush 返回 [(pcm float32 单声道, 采样率)]。
+    """
+
+    def __init__(self):
+        self.codec = av.CodecContext.create('mp3float', 'r')
+        self.first = True
+
+    def feed(self, data):
+        out = []
+        if not data:  # 空数据会被解析器当作流结束
+            return out
+        for packet in self.codec.parse(data):
+            if self.first:
+                self.first = False
+                # 编码器写入的 Xing/Info 头帧不含音频，解码出来是一帧静音
+                if b'Xing' in bytes(packet) or b'Info' in bytes(packet):
+                    continue
+            out += self._decode(packet)
+        return out
+
+    def flush(self):
+        out = []
+        for packet in self.codec.parse(b''):
+            out += self._decode(packet)
+        out += self._decode(None)
+        self.codec = av.CodecContext.create('mp3float', 'r')
+        self.first = True
+        return out
+
+    def _decode(self, packet):
+        try:
+            frames = self.codec.decode(packet)
+        except av.error.FFmpegError as e:
+            print(f"Error decoding mp3 frame: {e}")
+            return []
+        return [(frame.to_ndarray()[0], frame.sample_rate) for frame in frames]
+
@@ -1,13 +1,16 @@
+import re
 import time
+import functools
+import os
 import numpy as np
 import soundfile as sf
-import resampy
 import asyncio
 import edge_tts
 
 from typing import Iterator
 
 import requests
+from requests.adapters import HTTPAdapter
 import io
 import soundfile as sf
 import logging
@@ -15,10 +18,15 @@ import logging
 import queue
 from queue import Queue
 from io import BytesIO
-from threading import Thread, Event
+from threading import Thread, Event, Lock
 from enum import Enum
 from pydub import AudioSegment
 
+from tts.resampler import SegmentResampler, StreamResampler, resample
+from tts.streamdecode import FrameChunker, Mp3Decoder, OggDecoder, PcmDecoder
+from tts.speechcache import SpeechCache, speech_cache, voice_id
+from tts.cancel import CancelToken, abort_response
+
 logger = logging.getLogger(__name__)
 logging.basicConfig(
     level=logging.INFO,  # 根据需要调整日志级别，比如 DEBUG、INFO、WARNING
@@ -28,7 +36,52 @@ class State(Enum):
     RUNNING=0
     PAUSE=1
 
+_SENTENCE_END = re.compile(r'(?<=[。！？；!?;…\n])|(?<=\.)(?=\s)')
+
+def split_sentences(text, min_len=4):
+    """按句末标点切分文本，过短的片段并入上一句。"""
+    sentences = []
+    for piece in _SENTENCE_END.split(text):
+        piece = piece.strip()
+        if not piece:
+            continue
+        if sentences and len(piece) < min_len:
+            sentences[-1] += piece
+        else:
+            sentences.append(piece)
+    return sentences
+
+_http = None
+_http_lock = Lock()
+
+def http_session():
+    """所有TTS后端共用的 keep-alive 连接池，各请求复用到TTS服务的连接。"""
+    global _http
+    with _http_lock:
+        if _http is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http = session
+    return _http
+
+def read_ref_audio(path):
+    """参考音频只读一次，之后直接用缓存的字节上传；与 voice_id 一样按大小和修改时间区分，替换文件后重新读取。"""
+    st = os.stat(path)
+    return _read_ref_audio(path, st.st_size, st.st_mtime_ns)
+
+@functools.lru_cache(maxsize=8)
+def _read_ref_audio(path, size, mtime_ns):
+    with open(path, 'rb') as f:
+        return f.read()
+
 class BaseTTS:
+    """
+    按句流水线合成：合成线程把消息切成句子逐句合成，音频块放入有界队列；
+    播放线程按 parent 中尚未播放的音频量限速写入，第N句播放时第N+1句已在合成。
+    子类实现 synthesize(text)，逐块产出 16khz float32 pcm。
+    """
     def __init__(self, opt, parent):
         self.opt=opt
         self.parent = parent
@@ -40,95 +93,236 @@ class BaseTTS:
 
         self.msgqueue = Queue()
         self.state = State.RUNNING
+        self.audioqueue = Queue(8)  # (代号, 缓冲代号, pcm块)，合成线程 -> 播放线程
+        self.talk_gen = 0  # 每次打断加一，旧代号的消息和音频块直接丢弃
+        self.lookahead = getattr(opt, 'tts_lookahead', 3.0)  # 合成最多领先播放的音频秒数
+        cache_dir = getattr(opt, 'tts_cache_dir', None)
+        self.cache = speech_cache(cache_dir, int(getattr(opt, 'tts_cache_mb', 256)) << 20) if cache_dir else None
+        self.failed = False  # 后端请求出错时置位，本句的不完整音频不写入缓存
+        self.token = CancelToken()  # 当前代号的取消令牌，打断时取消并换新
+        self.synth_token = self.token  # 正在合成的消息所用的令牌，HTTP 响应注册到它上面
+        self.render_quit = None  # 合成/播放线程所属的退出事件，线程在运行时不重复启动
+        self.start_lock = Lock()
 
     def pause_talk(self):
+        # 先推进代号再换令牌: 合成线程拿到新令牌时一定能看到新代号
+        self.talk_gen += 1
+        token, self.token = self.token, CancelToken()
         self.msgqueue.queue.clear()
         self.state = State.PAUSE
+        token.cancel()
 
     def put_msg_txt(self,msg): 
-        self.msgqueue.put(msg)
+        self.msgqueue.put((self.talk_gen, msg))
 
     def render(self,quit_event):
+        # render 可能被多次调用(启动线程、每次 WebRTC 连接)，两个队列只能各有一个消费者，否则块会乱序、消息会并发合成
+        with self.start_lock:
+            if self.render_quit is not None and not self.render_quit.is_set():
+                return
+            self.render_quit = quit_event
         process_thread = Thread(target=self.process_tts, args=(quit_event,))
         process_thread.start()
+        play_thread = Thread(target=self.play_tts, args=(quit_event,))
+        play_thread.start()
     
     def process_tts(self,quit_event):        
         while not quit_event.is_set():
             try:
-                msg = self.msgqueue.get(block=True, timeout=1)
-                self.state=State.RUNNING
+                gen, msg = self.msgqueue.get(block=True, timeout=1)
             except queue.Empty:
                 continue
-            self.txt_to_audio(msg)
+            if gen != self.talk_gen:
+                continue
+            self.state=State.RUNNING
+            self.txt_to_audio(msg, gen, quit_event)
         print('ttsreal thread stop')
-    
-    def txt_to_audio(self,msg):
-        pass
+
+    def play_tts(self,quit_event):
+        while not quit_event.is_set():
+            try:
+                gen, ring_gen, pcm = self.audioqueue.get(block=True, timeout=1)
+            except queue.Empty:
+                continue
+            # 已缓冲的音频超过 lookahead 时等待播放消耗，打断后立即放行(旧块随后被丢弃)
+            while gen == self.talk_gen and self.parent.audio_backlog() > self.lookahead and not quit_event.is_set():
+                time.sleep(0.02)
+            if gen == self.talk_gen:
+                # 检查与写入之间被打断时，缓冲按 ring_gen 丢弃这一块
+                self.parent.put_audio_block(pcm, ring_gen)
+        print('ttsreal play thread stop')
+
+    def txt_to_audio(self,msg,gen=None,quit_event=None):
+        text = msg if isinstance(msg, str) else msg[0]
+        token = self.token
+        # 先取音频缓冲代号再检查消息代号: 打断时先推进消息代号后推进缓冲代号，
+        # 取到新缓冲代号时旧消息一定已被识别出来
+        audio_gen = getattr(self.parent, 'audio_gen', None)
+        ring_gen = audio_gen() if audio_gen is not None else None
+        gen = self.talk_gen if gen is None else gen
+        if gen != self.talk_gen:
+            return
+        self.synth_token = token
+        try:
+            self.__speak(text, gen, ring_gen, token, quit_event)
+        finally:
+            if token.cancelled:
+                # 打断到合成线程真正停下(HTTP 流中止、推帧循环退出)的耗时
+                elapsed = time.perf_counter() - token.cancelled_at
+                logger.info(f"{type(self).__name__} 合成已取消，耗时: {elapsed:.3f}s")
+                metrics = getattr(self.parent, 'metrics', None)
+                if metrics is not None:
+                    metrics.observe('tts_cancel', elapsed)
+
+    def __speak(self, text, gen, ring_gen, token, quit_event):
+        def stopped():
+            return gen != self.talk_gen or token.cancelled or (quit_event is not None and quit_event.is_set())
+        t = time.perf_counter()
+        first = True
+        chunker = FrameChunker(self.chunk)  # 只送出整20ms帧，不足一帧的尾巴并入下一块，消息结束时补零
+        for sentence in split_sentences(text):
+            key = SpeechCache.key(type(self).__name__, self.voice(), sentence) if self.cache is not None else None
+            cached = self.cache.get(key) if key is not None else None
+            if cached is not None:
+                logger.info(f"{type(self).__name__} 语音缓存命中，命中率: {self.cache.hit_rate():.1%}")
+                blocks = (cached[i:i + self.sample_rate] for i in range(0, len(cached), self.sample_rate))
+            else:
+                self.failed = False
+                blocks = self.synthesize(sentence)
+            synthesized = []
+            for pcm in blocks:
+                if stopped():
+                    return
+                if cached is None and key is not None:
+                    synthesized.append(pcm)
+                pcm = chunker.push(pcm)
+                if len(pcm) == 0:
+                    continue
+                if first:
+                    ttfa = time.perf_counter() - t
+                    logger.info(f"{type(self).__name__} 首包音频耗时: {ttfa:.3f}s")
+                    metrics = getattr(self.parent, 'metrics', None)
+                    if metrics is not None:
+                        metrics.observe('tts_ttfa', ttfa)
+                    first = False
+                if not self.__enqueue((gen, ring_gen, pcm), stopped):
+                    return
+            token.forget()
+            if synthesized and not self.failed and not stopped():
+                self.cache.put(key, np.concatenate(synthesized))
+        tail = chunker.flush()
+        if len(tail):
+            self.__enqueue((gen, ring_gen, tail), stopped)
+
+    def __enqueue(self, item, stopped):
+        # 队列满时阻塞合成(有界预取)，打断后播放线程会清掉旧块让这里继续并退出
+        while True:
+            try:
+                self.audioqueue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if stopped():
+                    return False
+
+    def synthesize(self,text):
+        """逐块产出 text 的 16khz float32 pcm。"""
+        return iter(())
+
+    def voice(self):
+        """缓存键中的音色部分，参考音频或参考文本变化后不会命中旧缓存。"""
+        return voice_id(getattr(self.opt, 'REF_FILE', None), getattr(self.opt, 'REF_TEXT', None))
+
+    def http_request(self, method, url, **kwargs):
+        """经共享连接池发起流式请求，记录是否新建连接及响应头到达(首字节)耗时；响应随当前合成的令牌取消而中止。"""
+        session = http_session()
+        request = session.prepare_request(requests.Request(method, url, **kwargs))
+        settings = session.merge_environment_settings(request.url, {}, True, None, None)
+        try:
+            # 按适配器自己的连接池键取到本次请求会用的池，比较请求前后的建连次数
+            adapter = session.get_adapter(request.url)
+            host_params, pool_kwargs = adapter.build_connection_pool_key_attributes(request, settings['verify'], settings['cert'])
+            pool = adapter.poolmanager.connection_from_host(**host_params, pool_kwargs=pool_kwargs)
+            opened = pool.num_connections
+        except Exception:
+            pool = None
+        t = time.perf_counter()
+        res = session.send(request, **settings)
+        ttfb = time.perf_counter() - t
+        if pool is None:
+            conn = '连接'
+        else:
+            conn = '复用连接' if pool.num_connections == opened else '新建连接'
+        logger.info(f"{type(self).__name__} {conn}，首字节耗时: {ttfb:.3f}s")
+        metrics = getattr(self.parent, 'metrics', None)
+        if metrics is not None:
+            metrics.observe('tts_ttfb', ttfb)
+        # 打断时中止下载，阻塞在 iter_content 里的读取立即返回
+        self.synth_token.on_cancel(lambda: abort_response(res))
+        return res
     
 
 ###########################################################################################
 class EdgeTTS(BaseTTS):
-    def txt_to_audio(self,msg):
-        voicename = "zh-TW-HsiaoYuNeural"
-        text = msg
-        t = time.time()
-        asyncio.new_event_loop().run_until_complete(self.__main(voicename,text))
-        print(f'-------edge tts time:{time.time()-t:.4f}s')
-
-        self.input_stream.seek(0)
-        stream = self.__create_bytes_stream(self.input_stream)
-        streamlen = stream.shape[0]
-        idx=0
-        while streamlen >= self.chunk and self.state==State.RUNNING:
-            self.parent.put_audio_frame(stream[idx:idx+self.chunk])
-            streamlen -= self.chunk
-            idx += self.chunk
-        #if streamlen>0:  #skip last frame(not 20ms)
-        #    self.queue.put(stream[idx:])
-        self.input_stream.seek(0)
-        self.input_stream.truncate() 
+    """
+    edge-tts 在常驻的事件循环线程上运行，communicate.stream() 每到一块 mp3 就增量解码、重采样后立即产出，
+    首帧耗时从整句合成时间降到首块到达时间。
+    """
+    def __init__(self, opt, parent):
+        super().__init__(opt, parent)
+        self.loop = asyncio.new_event_loop()
+        Thread(target=self.loop.run_forever, name='edgetts-loop', daemon=True).start()
 
-    def __create_bytes_stream(self,byte_stream):
-        #byte_stream=BytesIO(buffer)
-        stream, sample_rate = sf.read(byte_stream) # [T*sample_rate,] float64
-        print(f'[INFO]tts audio stream {sample_rate}: {stream.shape}')
-        stream = stream.astype(np.float32)
+    voicename = "zh-TW-HsiaoYuNeural"
 
-        if stream.ndim > 1:
-            print(f'[WARN] audio has {stream.shape[1]} channels, only use the first.')
-            stream = stream[:, 0]
-    
-        if sample_rate != self.sample_rate and stream.shape[0]>0:
-            print(f'[WARN] audio sample rate is {sample_rate}, resampling into {self.sample_rate}.')
-            stream = resampy.resample(x=stream, sr_orig=sample_rate, sr_new=self.sample_rate)
+    def voice(self):
+        return self.voicename
 
-        return stream
-    
-    async def __main(self,voicename: str, text: str):
-        communicate = edge_tts.Communicate(text, voicename)
+    def synthesize(self,text):
+        voicename = self.voicename
+        t = time.time()
+        chunks = Queue()
+        future = asyncio.run_coroutine_threadsafe(self.__main(voicename, text, chunks), self.loop)
+        self.synth_token.on_cancel(future.cancel)
+        decoder = Mp3Decoder()
+        resampler = SegmentResampler(self.sample_rate)
+        try:
+            while True:
+                data = chunks.get()
+                if data is None:
+                    break
+                yield from resampler.process(decoder.feed(data))
+            yield from resampler.process(decoder.flush())
+            yield resampler.flush()
+        finally:
+            future.cancel()  # 打断时消费方提前关闭生成器，停止接收
+        print(f'-------edge tts time:{time.time()-t:.4f}s')
 
-        #with open(OUTPUT_FILE, "wb") as file:
-        first = True
-        async for chunk in communicate.stream():
-            if first:
-                first = False
-            if chunk["type"] == "audio" and self.state==State.RUNNING:
-                #self.push_audio(chunk["data"])
-                self.input_stream.write(chunk["data"])
-                #file.write(chunk["data"])
-            elif chunk["type"] == "WordBoundary":
-                pass
+    async def __main(self,voicename: str, text: str, chunks: Queue):
+        try:
+            communicate = edge_tts.Communicate(text, voicename)
+            async for chunk in communicate.stream():
+                if self.synth_token.cancelled:
+                    break
+                if chunk["type"] == "audio":
+                    chunks.put(chunk["data"])
+                elif chunk["type"] == "WordBoundary":
+                    pass
+        except Exception:
+            self.failed = True
+            logger.exception('edgetts')
+        finally:
+            chunks.put(None)
 
 ###########################################################################################
 class VoitsTTS(BaseTTS):
 
-    def txt_to_audio(self,msg): 
+    def synthesize(self,text): 
 
-        self.stream_tts(
+        return self.stream_tts(
 
             self.gpt_sovits(
 
-                msg,
+                text,
 
                 self.opt.REF_FILE,  
 
@@ -180,25 +374,14 @@ class VoitsTTS(BaseTTS):
 
         try:
 
-            res = requests.post(
-
-                f"{server_url}/tts",
-
-                json=req,
-
-                stream=True,
-
-            )
-
-            end = time.perf_counter()
-
-            print(f"gpt_sovits Time to make POST: {end-start}s")
+            res = self.http_request("POST", f"{server_url}/tts", json=req)
 
 
 
             if res.status_code != 200:
 
                 print("Error:", res.text)
+                self.failed = True
 
                 return
 
@@ -220,15 +403,23 @@ class VoitsTTS(BaseTTS):
 
                     first = False
 
-                if chunk and self.state==State.RUNNING:
+                if self.synth_token.cancelled:
+
+                    break
+
+                if chunk:
 
                     yield chunk
 
+            res.close()
+
             #print("gpt_sovits response.elapsed:", res.elapsed)
 
         except Exception as e:
 
-            print(e)
+            if not self.synth_token.cancelled:  # 打断时中止连接引起的异常不算失败
+                print(e)
+            self.failed = True
 
 
 
@@ -256,7 +447,7 @@ class VoitsTTS(BaseTTS):
 
             print(f'[WARN] audio sample rate is {sample_rate}, resampling into {self.sample_rate}.')
 
-            stream = resampy.resample(x=stream, sr_orig=sample_rate, sr_new=self.sample_rate)
+            stream = resample(stream, sample_rate, self.sample_rate)
 
 
 
@@ -265,35 +456,17 @@ class VoitsTTS(BaseTTS):
 
 
     def stream_tts(self, audio_stream):
+        # 网络块不按 ogg 文件边界切分：按页重组，每个完整的 ogg 段到齐后才解码
+        decoder = OggDecoder()
+        resampler = SegmentResampler(self.sample_rate)  # 服务端采样率不是16k时按流重采样，块间保留滤波状态
         for chunk in audio_stream:
             if chunk is not None and len(chunk) > 0:
-                byte_stream = io.BytesIO(chunk)
-                
-                # 调试输出字节流的长度和前几个字节
-                print(f"Byte stream length: {len(chunk)}")
-                print(f"First 10 bytes: {chunk[:10]}")
-
-                try:
-                    # 确保字节流是有效的音频格式
-                    stream, sample_rate = sf.read(byte_stream)
-                    print(f"Sample rate: {sample_rate}, Stream shape: {stream.shape}")
-                except Exception as e:
-                    print(f"Error reading audio stream: {e}")
-                    continue  # 跳过错误部分，继续处理下一个块
-
-                streamlen = stream.shape[0]
-                idx = 0
-
-                while streamlen >= self.chunk:
-                    self.parent.put_audio_frame(stream[idx:idx + self.chunk])
-                    streamlen -= self.chunk
-                    idx += self.chunk
+                yield from resampler.process(decoder.feed(chunk))
+        yield from resampler.process(decoder.flush())
+        yield resampler.flush()
 
 class CosyVoiceTTS(BaseTTS):
-   def txt_to_audio(self, msg):
-        print("DEBUG msg =", msg, "type =", type(msg))
-        text = msg if isinstance(msg, str) else msg[0]
-
+   def synthesize(self, text):
         audio_stream = self.cosy_voice(
             text,
             self.opt.REF_FILE,
@@ -301,7 +474,7 @@ class CosyVoiceTTS(BaseTTS):
             "zh",
             self.opt.TTS_SERVER,
         )
-        self.stream_tts(audio_stream, msg)
+        return self.stream_tts(audio_stream)
 
 
 
@@ -313,14 +486,12 @@ class CosyVoiceTTS(BaseTTS):
             'prompt_text': reftext
         }
         try:
-            files = [('prompt_wav', ('prompt_wav', open(reffile, 'rb'), 'application/octet-stream'))]
-            res = requests.request("GET", f"{server_url}/inference_zero_shot", data=payload, files=files, stream=True)
-            
-            end = time.perf_counter()
-            logger.info(f"cosy_voice Time to make POST: {end-start}s")
+            files = [('prompt_wav', ('prompt_wav', read_ref_audio(reffile), 'application/octet-stream'))]
+            res = self.http_request("GET", f"{server_url}/inference_zero_shot", data=payload, files=files)
 
             if res.status_code != 200:
                 logger.error("Error:%s", res.text)
+                self.failed = True
                 return
                 
             first = True
@@ -330,36 +501,26 @@ class CosyVoiceTTS(BaseTTS):
                     end = time.perf_counter()
                     logger.info(f"cosy_voice Time to first chunk: {end-start}s")
                     first = False
-                if chunk and self.state==State.RUNNING:
+                if self.synth_token.cancelled:
+                    break
+                if chunk:
                     yield chunk
+            res.close()
         except Exception as e:
-            logger.exception('cosyvoice')
-
-   def stream_tts(self, audio_stream, msg):
-        # 判断msg类型，兼容字符串和两元组
-        if isinstance(msg, (tuple, list)) and len(msg) == 2:
-            text, textevent = msg
-        else:
-            text = msg
-            textevent = None  # 没有事件数据时可设为None或者空字典 {}
+            self.failed = True
+            if not self.synth_token.cancelled:  # 打断时中止连接引起的异常不算失败
+                logger.exception('cosyvoice')
 
-        first = True
+   def stream_tts(self, audio_stream):
+        decoder = PcmDecoder(22050)  # 块可能在采样中间断开，奇数字节留到下一块
+        resampler = StreamResampler(decoder.sample_rate, self.sample_rate)
         for chunk in audio_stream:
             if chunk is not None and len(chunk) > 0:
-                stream = np.frombuffer(chunk, dtype=np.int16).astype(np.float32) / 32767
-                stream = resampy.resample(x=stream, sr_orig=22050, sr_new=self.sample_rate)
-                streamlen = stream.shape[0]
-                idx = 0
-                while streamlen >= self.chunk:
-                    # eventpoint = None
-                    if first:
-                        # eventpoint = {'status': 'start', 'text': text, 'msgenvent': textevent}
-                        first = False
-                    self.parent.put_audio_frame(stream[idx:idx + self.chunk])  # 只传一个参数
-                    streamlen -= self.chunk
-                    idx += self.chunk
+                yield resampler.process(decoder.feed(chunk))
+        decoder.flush()
+        yield resampler.flush()
         # 结束时传入一段静音
-        self.parent.put_audio_frame(np.zeros(self.chunk, np.float32))  # 只传一个参数
+        yield np.zeros(self.chunk, np.float32)
 
 
 ###########################################################################################
@@ -368,10 +529,10 @@ class XTTS(BaseTTS):
         super().__init__(opt,parent)
         self.speaker = self.get_speaker(opt.REF_FILE, opt.TTS_SERVER)
 
-    def txt_to_audio(self,msg): 
-        self.stream_tts(
+    def synthesize(self,text): 
+        return self.stream_tts(
             self.xtts(
-                msg,
+                text,
                 self.speaker,
                 "zh-cn", #en args.language,
                 self.opt.TTS_SERVER, #"http://localhost:9000", #args.server_url,
@@ -380,8 +541,8 @@ class XTTS(BaseTTS):
         )
 
     def get_speaker(self,ref_audio,server_url):
-        files = {"wav_file": ("reference.wav", open(ref_audio, "rb"))}
-        response = requests.post(f"{server_url}/clone_speaker", files=files)
+        files = {"wav_file": ("reference.wav", read_ref_audio(ref_audio))}
+        response = http_session().post(f"{server_url}/clone_speaker", files=files)
         return response.json()
 
     def xtts(self,text, speaker, language, server_url, stream_chunk_size) -> Iterator[bytes]:
@@ -389,39 +550,43 @@ class XTTS(BaseTTS):
         speaker["text"] = text
         speaker["language"] = language
         speaker["stream_chunk_size"] = stream_chunk_size  # you can reduce it to get faster response, but degrade quality
-        res = requests.post(
-            f"{server_url}/tts_stream",
-            json=speaker,
-            stream=True,
-        )
-        end = time.perf_counter()
-        print(f"xtts Time to make POST: {end-start}s")
+        try:
+            res = self.http_request("POST", f"{server_url}/tts_stream", json=speaker)
 
-        if res.status_code != 200:
-            print("Error:", res.text)
-            return
+            if res.status_code != 200:
+                print("Error:", res.text)
+                self.failed = True
+                return
 
-        first = True
-        for chunk in res.iter_content(chunk_size=960): #24K*20ms*2
-            if first:
-                end = time.perf_counter()
-                print(f"xtts Time to first chunk: {end-start}s")
-                first = False
-            if chunk:
-                yield chunk
+            first = True
+            for chunk in res.iter_content(chunk_size=960): #24K*20ms*2
+                if first:
+                    end = time.perf_counter()
+                    print(f"xtts Time to first chunk: {end-start}s")
+                    first = False
+                if self.synth_token.cancelled:
+                    break
+                if chunk:
+                    yield chunk
+            res.close()
+        except Exception:
+            self.failed = True
+            if not self.synth_token.cancelled:  # 打断时中止连接引起的异常不算失败
+                logger.exception('xtts')
+            return
 
         print("xtts response.elapsed:", res.elapsed)
     
     def stream_tts(self,audio_stream):
+        decoder = PcmDecoder(24000)  # 块可能在采样中间断开，奇数字节留到下一块
+        resampler = StreamResampler(decoder.sample_rate, self.sample_rate)
         for chunk in audio_stream:
+            if self.synth_token.cancelled:
+                return
             if chunk is not None and len(chunk)>0:          
-                stream = np.frombuffer(chunk, dtype=np.int16).astype(np.float32) / 32767
-                stream = resampy.resample(x=stream, sr_orig=24000, sr_new=self.sample_rate)
+                stream = decoder.feed(chunk)
                 #byte_stream=BytesIO(buffer)
                 #stream = self.__create_bytes_stream(byte_stream)
-                streamlen = stream.shape[0]
-                idx=0
-                while streamlen >= self.chunk:
-                    self.parent.put_audio_frame(stream[idx:idx+self.chunk])
-                    streamlen -= self.chunk
-                    idx += self.chunk 
\ No newline at end of file
+                yield resampler.process(stream)
+        decoder.flush()
+        yield resampler.flush() 
\ No newline at end of file
@@ -2,7 +2,7 @@ import librosa
 import librosa.filters
 import numpy as np
 # import tensorflow as tf
-from scipy import signal
+from scipy import signal, sparse
 from scipy.io import wavfile
 from .hparams import hparams as hp
 
@@ -43,6 +43,8 @@ def linearspectrogram(wav):
     return S
 
 def melspectrogram(wav):
+    if not hp.use_lws:
+        return mel_engine().mel(wav)
     D = _stft(preemphasis(wav, hp.preemphasis, hp.preemphasize))
     S = _amp_to_db(_linear_to_mel(np.abs(D))) - hp.ref_level_db
     
@@ -50,13 +52,165 @@ def melspectrogram(wav):
         return _normalize(S)
     return S
 
+class MelEngine:
+    """Vectorized ``melspectrogram`` with everything but the signal precomputed.
+
+    The analysis window, the (sparse) mel basis and the dB/normalization
+    constants are built once. ``mel`` accepts a single signal of shape
+    (samples,) or a batch of equal-length signals of shape (sessions, samples)
+    and computes all of them in one call, with the ``numpy`` backend (float64,
+    the reference used by ``melspectrogram``) or the ``torch`` CPU backend
+    (float32).
+    """
+
+    def __init__(self, backend='numpy'):
+        if backend not in ('numpy', 'torch'):
+            raise ValueError(f'unknown mel backend {backend!r}')
+        self.backend = backend
+        self.n_fft = hp.n_fft
+        self.hop = get_hop_size()
+        self.pad = self.n_fft // 2
+        win_size = hp.win_size or hp.n_fft
+        window = signal.get_window('hann', win_size, fftbins=True)
+        lpad = (self.n_fft - win_size) // 2
+        self.window = np.pad(window, (lpad, self.n_fft - win_size - lpad))
+        basis = _build_mel_basis()
+        # CSR: faster than the dense dot and, unlike BLAS, bit-stable whatever the block width
+        self.basis = sparse.csr_matrix(basis)
+        self.min_level = np.exp(hp.min_level_db / 20 * np.log(10))
+        # S = 20*log10(max(min_level, mel)) - ref_level_db, then _normalize(S), folded into c1*log10 + c0
+        if hp.signal_normalization:
+            scale = 2 * hp.max_abs_value if hp.symmetric_mels else hp.max_abs_value
+            offset = -hp.max_abs_value if hp.symmetric_mels else 0.
+            self.c1 = 20 * scale / -hp.min_level_db
+            self.c0 = scale + offset - hp.ref_level_db * scale / -hp.min_level_db
+            low = -hp.max_abs_value if hp.symmetric_mels else 0.
+            self.clip = (low, hp.max_abs_value) if hp.allow_clipping_in_normalization else None
+        else:
+            self.c1, self.c0, self.clip = 20., -hp.ref_level_db, None
+        if backend == 'torch':
+            import torch
+            self.torch = torch
+            self.torch_window = torch.from_numpy(self.window.astype(np.float32))
+            self.torch_basis = torch.from_numpy(basis.astype(np.float32))
+
+    def emphasize(self, wav, zi=None):
+        """Pre-emphasis along the last axis; ``zi`` is the previous sample (streaming)."""
+        wav = np.asarray(wav, dtype=np.float64)
+        if not hp.preemphasize:
+            return wav
+        y = wav.copy()
+        y[..., 1:] -= hp.preemphasis * wav[..., :-1]
+        if zi is not None:
+            y[..., 0] -= hp.preemphasis * zi
+        return y
+
+    def frames(self, y):
+        """Mel frames of an emphasized, already padded signal (no centering): (..., num_mels, n)."""
+        n = 1 + (y.shape[-1] - self.n_fft) // self.hop
+        segments = np.lib.stride_tricks.sliding_window_view(y, self.n_fft, axis=-1)[..., :(n - 1) * self.hop + 1:self.hop, :]
+        spec = np.abs(np.fft.rfft(segments * self.window, axis=-1))  # (..., n, n_fft // 2 + 1)
+        lead = spec.shape[:-2]
+        mel = self.basis @ spec.reshape(-1, spec.shape[-1]).T  # (num_mels, prod(lead) * n)
+        mel = np.moveaxis(mel.reshape((hp.num_mels,) + lead + (n,)), 0, -2)
+        return self._scale(np.log10(np.maximum(self.min_level, mel)))
+
+    def _scale(self, log_mel):
+        S = self.c1 * log_mel + self.c0
+        if self.clip is not None:
+            S = S.clip(*self.clip)
+        return S
+
+    def mel(self, wav):
+        """``melspectrogram`` of (samples,) or (sessions, samples) input."""
+        if self.backend == 'torch':
+            return self._mel_torch(wav)
+        y = self.emphasize(wav)
+        pad = [(0, 0)] * (y.ndim - 1) + [(self.pad, self.pad)]
+        return self.frames(np.pad(y, pad))
+
+    def _mel_torch(self, wav):
+        torch = self.torch
+        x = torch.as_tensor(np.asarray(wav, dtype=np.float32))
+        if hp.preemphasize:
+            y = x.clone()
+            y[..., 1:] -= hp.preemphasis * x[..., :-1]
+        else:
+            y = x
+        spec = torch.stft(y, self.n_fft, self.hop, self.n_fft, window=self.torch_window,
+                          center=True, pad_mode='constant', return_complex=True).abs()
+        mel = torch.matmul(self.torch_basis, spec)
+        S = self.c1 * torch.log10(torch.clamp_min(mel, self.min_level)) + self.c0
+        if self.clip is not None:
+            S = S.clamp(*self.clip)
+        return S.numpy()
+
+
+_mel_engine = None
+
+def mel_engine():
+    global _mel_engine
+    if _mel_engine is None:
+        _mel_engine = MelEngine()
+    return _mel_engine
+
+
+class StreamingMel:
+    """Incremental ``melspectrogram`` over an endless 16 kHz stream.
+
+    Pre-emphasis state and the not-yet-complete STFT frame are carried between
+    calls, so every ``push`` only computes the hops that became complete. The
+    frames returned by successive pushes (plus ``flush``) are bit-identical to
+    ``melspectrogram`` of the concatenated stream.
+    """
+
+    def __init__(self):
+        self.engine = mel_engine()
+        self.n_fft = self.engine.n_fft
+        self.hop = self.engine.hop
+        self._zi = 0.
+        # center=True: the stream starts with n_fft // 2 zeros of padding
+        self._buffer = np.zeros(self.engine.pad)
+        self.samples = 0  # samples pushed so far
+        self.frames = 0  # mel frames returned so far
+
+    def push(self, wav):
+        """Feed new samples; returns the (num_mels, n) frames that became complete (n may be 0)."""
+        if len(wav) == 0:
+            return np.zeros((hp.num_mels, 0))
+        self.samples += len(wav)
+        self._buffer = np.concatenate((self._buffer, self.engine.emphasize(wav, self._zi)))
+        self._zi = float(wav[-1])
+        if len(self._buffer) < self.n_fft:
+            return np.zeros((hp.num_mels, 0))
+        n = 1 + (len(self._buffer) - self.n_fft) // self.hop
+        S = self.engine.frames(self._buffer[:(n - 1) * self.hop + self.n_fft])
+        self._buffer = self._buffer[n * self.hop:]
+        self.frames += n
+        return S
+
+    def flush(self):
+        """Emit the frames that need the tail padding; the stream must not be pushed to afterwards."""
+        total = 1 + self.samples // self.hop
+        if total <= self.frames:
+            return np.zeros((hp.num_mels, 0))
+        y = np.pad(self._buffer, (0, self.engine.pad))
+        y = y[:(total - self.frames - 1) * self.hop + self.n_fft]
+        self.frames = total
+        return self.engine.frames(y)
+
+_lws = None
+
 def _lws_processor():
-    import lws
-    return lws.lws(hp.n_fft, get_hop_size(), fftsize=hp.win_size, mode="speech")
+    global _lws
+    if _lws is None:
+        import lws
+        _lws = lws.lws(hp.n_fft, get_hop_size(), fftsize=hp.win_size, mode="speech")
+    return _lws
 
 def _stft(y):
     if hp.use_lws:
-        return _lws_processor(hp).stft(y).T
+        return _lws_processor().stft(y).T
     else:
         return librosa.stft(y=y, n_fft=hp.n_fft, hop_length=get_hop_size(), win_length=hp.win_size)
 
@@ -134,3 +288,41 @@ def _denormalize(D):
         return (((D + hp.max_abs_value) * -hp.min_level_db / (2 * hp.max_abs_value)) + hp.min_level_db)
     else:
         return ((D * -hp.min_level_db / hp.max_abs_value) + hp.min_level_db)
+
+
+# max abs difference from _librosa_melspectrogram allowed per MelEngine backend (normalized mel units)
+MEL_TOLERANCE = {'numpy': 1e-9, 'torch': 1e-3}
+
+def _librosa_melspectrogram(wav):
+    # the per-call librosa/scipy path melspectrogram used before MelEngine, kept as the benchmark and
+    # tolerance baseline. librosa>=0.10 (pinned in requirements.txt) pads with zeros like MelEngine;
+    # older releases default to reflect padding and differ in the first and last two frames.
+    D = librosa.stft(y=signal.lfilter([1, -hp.preemphasis], [1], wav), n_fft=hp.n_fft,
+                     hop_length=get_hop_size(), win_length=hp.win_size)
+    S = _amp_to_db(_linear_to_mel(np.abs(D))) - hp.ref_level_db
+    return _normalize(S)
+
+
+if __name__ == '__main__':
+    # python -m wav2lip.audio: MelEngine benchmark (bit-compatibility of StreamingMel: tests/test_streaming_mel.py)
+    import time
+
+    rng = np.random.default_rng(0)
+    sessions, length, iters = 8, 52 * 320, 50  # one LipASR window (l + r + batch_size*2 frames) per session
+    batch = (rng.standard_normal((sessions, length)) * 0.3).astype(np.float32)
+    baseline = np.stack([_librosa_melspectrogram(w) for w in batch])
+    engines = [('librosa', lambda b: np.stack([_librosa_melspectrogram(w) for w in b]), 0.),
+               ('numpy', MelEngine('numpy').mel, MEL_TOLERANCE['numpy'])]
+    try:
+        engines.append(('torch', MelEngine('torch').mel, MEL_TOLERANCE['torch']))
+    except ImportError:
+        pass
+    print(f'{"backend":<10}{"ms/call":>10}{"max diff":>12}   ({sessions} sessions x {length} samples)')
+    for name, fn, tolerance in engines:
+        out = fn(batch)
+        assert np.abs(out - baseline).max() <= tolerance, name
+        t = time.perf_counter()
+        for _ in range(iters):
+            fn(batch)
+        elapsed = (time.perf_counter() - t) / iters * 1000
+        print(f'{name:<10}{elapsed:>10.2f}{np.abs(out - baseline).max():>12.2e}')
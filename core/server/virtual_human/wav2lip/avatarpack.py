@@ -0,0 +1,194 @@
+import os
+import json
+import mmap
+import glob
+import pickle
+import shutil
+import time
+
+import cv2
+import numpy as np
+
+PACK_DIR = 'pack'
+PACK_VERSION = 2
+
+
+class AvatarPack:
+    """Read-only, memory-mapped view of an avatar pack.
+
+    ``full_frames`` is (N, H, W, 3) uint8, ``face_frames`` is (N, h, w, 3) uint8
+    and ``coords`` is (N, 4) int32 holding (y1, y2, x1, x2) per frame. Every
+    process that maps the same pack shares one page-cache copy.
+    """
+
+    def __init__(self, pack_path, header, full_frames, face_frames, coords):
+        self.path = pack_path
+        self.header = header
+        self.full_frames = full_frames
+        self.face_frames = face_frames
+        self.coords = coords
+
+    def __len__(self):
+        return self.header['count']
+
+    def prefetch(self):
+        """Ask the kernel to start reading the mapped frames in the background."""
+        for frames in (self.full_frames, self.face_frames):
+            mm = getattr(frames, '_mmap', None)
+            if mm is not None and hasattr(mm, 'madvise'):
+                mm.madvise(mmap.MADV_WILLNEED)
+
+
+def _pack_path(avatar_path):
+    return os.path.join(avatar_path, PACK_DIR)
+
+
+def _sorted_imgs(path):
+    img_list = glob.glob(os.path.join(path, '*.[jpJP][pnPN]*[gG]'))
+    return sorted(img_list, key=lambda x: int(os.path.splitext(os.path.basename(x))[0]))
+
+
+def _source_stamp(avatar_path):
+    """Frame count and newest mtime of full_imgs/ and face_imgs/, size and mtime of coords.pkl.
+
+    Stored in header.json when a pack is written; a source that does not exist
+    is recorded as None.
+    """
+    stamp = {}
+    for name in ('full_imgs', 'face_imgs'):
+        imgs = _sorted_imgs(os.path.join(avatar_path, name))
+        stamp[name] = {'count': len(imgs), 'mtime_ns': max(os.stat(f).st_mtime_ns for f in imgs)} if imgs else None
+    coords_path = os.path.join(avatar_path, 'coords.pkl')
+    if os.path.isfile(coords_path):
+        st = os.stat(coords_path)
+        stamp['coords.pkl'] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    else:
+        stamp['coords.pkl'] = None
+    return stamp
+
+
+def _stale_sources(header, avatar_path):
+    """Names of the sources that changed since the pack was written.
+
+    Sources missing now are not compared, so an avatar shipped as a pack only
+    stays usable.
+    """
+    recorded = header.get('sources', {})
+    return [name for name, current in _source_stamp(avatar_path).items()
+            if current is not None and recorded.get(name) != current]
+
+
+def write_avatar_pack(avatar_path, full_frames, face_frames, coords):
+    """Write an avatar pack next to full_imgs/face_imgs.
+
+    ``full_frames`` and ``face_frames`` may be sequences of arrays or of image
+    paths; frames are streamed into the memory-mapped files one at a time so
+    the whole avatar never has to sit in RAM.
+    """
+    count = len(full_frames)
+    if count == 0 or len(face_frames) != count or len(coords) != count:
+        raise ValueError('avatar pack needs the same non-zero number of full frames, faces and coords '
+                         f'(got {count}, {len(face_frames)}, {len(coords)})')
+
+    def _frame(f):
+        if isinstance(f, str):
+            img = cv2.imread(f)
+            if img is None:
+                raise IOError(f'cannot read image {f}')
+            return img
+        return f
+
+    # stamp the sources before reading them: a change during the build leaves the pack stale, not wrong
+    sources = _source_stamp(avatar_path)
+    pack_path = _pack_path(avatar_path)
+    tmp_path = f'{pack_path}.tmp{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    first_full, first_face = _frame(full_frames[0]), _frame(face_frames[0])
+    full = np.lib.format.open_memmap(os.path.join(tmp_path, 'full.npy'), mode='w+',
+                                     dtype=np.uint8, shape=(count,) + first_full.shape)
+    face = np.lib.format.open_memmap(os.path.join(tmp_path, 'face.npy'), mode='w+',
+                                     dtype=np.uint8, shape=(count,) + first_face.shape)
+    for i in range(count):
+        full[i] = first_full if i == 0 else _frame(full_frames[i])
+        face[i] = first_face if i == 0 else _frame(face_frames[i])
+    full.flush()
+    face.flush()
+    del full, face
+
+    np.save(os.path.join(tmp_path, 'coords.npy'), np.asarray(coords, dtype=np.int32).reshape(count, 4))
+    header = {
+        'version': PACK_VERSION,
+        'count': count,
+        'full_shape': list(first_full.shape),
+        'face_shape': list(first_face.shape),
+        'created': int(time.time()),
+        'sources': sources,
+    }
+    with open(os.path.join(tmp_path, 'header.json'), 'w') as f:
+        json.dump(header, f)
+
+    shutil.rmtree(pack_path, ignore_errors=True)
+    os.replace(tmp_path, pack_path)
+    return pack_path
+
+
+def build_avatar_pack(avatar_path):
+    """Convert an existing full_imgs/face_imgs/coords.pkl avatar into a pack.
+
+    Run offline (``python -m wav2lip.avatarpack <avatar_path>...``) or from
+    genavatar; the server only maps packs and never builds one.
+    """
+    full_list = _sorted_imgs(os.path.join(avatar_path, 'full_imgs'))
+    face_list = _sorted_imgs(os.path.join(avatar_path, 'face_imgs'))
+    with open(os.path.join(avatar_path, 'coords.pkl'), 'rb') as f:
+        coords = pickle.load(f)
+    print(f'building avatar pack for {avatar_path} ({len(full_list)} frames)...')
+    return write_avatar_pack(avatar_path, full_list, face_list, coords)
+
+
+def open_avatar_pack(avatar_path):
+    """Map an avatar pack read-only, or return None if the avatar has no valid, up-to-date pack.
+
+    A pack whose full_imgs/, face_imgs/ or coords.pkl changed after it was
+    written is stale and not served.
+    """
+    pack_path = _pack_path(avatar_path)
+    header_path = os.path.join(pack_path, 'header.json')
+    if not os.path.isfile(header_path):
+        return None
+    try:
+        with open(header_path) as f:
+            header = json.load(f)
+        if header.get('version') != PACK_VERSION:
+            return None
+        full = np.load(os.path.join(pack_path, 'full.npy'), mmap_mode='r')
+        face = np.load(os.path.join(pack_path, 'face.npy'), mmap_mode='r')
+        coords = np.load(os.path.join(pack_path, 'coords.npy'))
+    except (OSError, ValueError) as e:
+        print(f'[WARN] invalid avatar pack {pack_path}: {e}')
+        return None
+    if not (len(full) == len(face) == len(coords) == header['count']):
+        print(f'[WARN] avatar pack {pack_path} is inconsistent with its header')
+        return None
+    stale = _stale_sources(header, avatar_path)
+    if stale:
+        print(f'[WARN] avatar pack {pack_path} is older than {", ".join(stale)}, '
+              f'rebuild it with: python -m wav2lip.avatarpack {avatar_path}')
+        return None
+    return AvatarPack(pack_path, header, full, face, coords)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build (or rebuild) the avatar pack of existing avatars')
+    parser.add_argument('avatar_path', nargs='+', help='avatar folder holding full_imgs/, face_imgs/ and coords.pkl')
+    parser.add_argument('--force', action='store_true', help='rebuild even if the pack is up to date')
+    args = parser.parse_args()
+    for avatar_path in args.avatar_path:
+        if not args.force and open_avatar_pack(avatar_path) is not None:
+            print(f'{avatar_path}: avatar pack is up to date')
+            continue
+        print(f'{avatar_path}: avatar pack written to {build_avatar_pack(avatar_path)}')
@@ -0,0 +1,240 @@
+"""Selectable inference engines for Wav2Lip.
+
+Every engine is called as ``engine(mel_batch, img_batch)`` with torch tensors of
+shape (B, 1, 80, 16) and (B, 6, H, W) and returns a (B, 3, H, W) torch tensor,
+so the lip-sync loop does not care which backend runs the network:
+
+- ``eager``: the PyTorch module as built from the checkpoint
+- ``torchscript``: traced and frozen TorchScript, cached as ``<ckpt>.ts.pt``
+- ``onnx``: ONNX Runtime on an export cached as ``<ckpt>.onnx``
+- ``int8``: ONNX Runtime on a dynamically int8-quantized export cached as
+  ``<ckpt>.int8.onnx`` (PyTorch's own dynamic quantization only covers Linear/LSTM
+  layers, which Wav2Lip does not have)
+
+The eager model has its BatchNorms folded into the convolutions before it is used
+or converted; ``channels_last`` additionally switches the PyTorch engines to NHWC.
+Converted artifacts are rebuilt whenever the checkpoint is newer than the cache, and
+are written under a per-process temporary name before being moved into place.
+
+Benchmark (fps and output drift against eager)::
+
+    python -m wav2lip.engine --checkpoint ./models/wav2lip.pth --engines eager,torchscript,onnx,int8
+"""
+import os
+import time
+import inspect
+
+import numpy as np
+import torch
+
+from .models import Wav2Lip, optimize_for_inference
+
+ENGINES = ('eager', 'torchscript', 'onnx', 'int8')
+FACE_SIZE = 256
+
+
+def _load(checkpoint_path, device):
+    if device == 'cuda':
+        checkpoint = torch.load(checkpoint_path)
+    else:
+        checkpoint = torch.load(checkpoint_path,
+                                map_location=lambda storage, loc: storage)
+    return checkpoint
+
+
+def build_eager_model(path, device, channels_last=False):
+    model = Wav2Lip()
+    checkpoint = _load(path, device)
+    s = checkpoint["state_dict"]
+    new_s = {}
+    for k, v in s.items():
+        new_s[k.replace('module.', '')] = v
+    model.load_state_dict(new_s)
+
+    model = model.to(device)
+    return optimize_for_inference(model, channels_last)
+
+
+def _example_inputs(device, batch_size=2, face_size=FACE_SIZE):
+    mel = torch.randn(batch_size, 1, 80, 16, device=device)
+    img = torch.rand(batch_size, 6, face_size, face_size, device=device)
+    return mel, img
+
+
+def _stale(artifact, checkpoint):
+    return not os.path.isfile(artifact) or os.path.getmtime(artifact) < os.path.getmtime(checkpoint)
+
+
+def _artifact(checkpoint, suffix):
+    return os.path.splitext(checkpoint)[0] + suffix
+
+
+def _publish(path, write):
+    """Write an artifact through ``write(tmp_path)`` and move it into place atomically.
+
+    Sessions started together may convert the same checkpoint at once; each writes its own
+    temporary file, so no process ever loads a half-written artifact.
+    """
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class EagerEngine:
+    name = 'eager'
+
+    def __init__(self, model, channels_last=False):
+        self.model = model
+        self.channels_last = channels_last
+
+    def __call__(self, mel_batch, img_batch):
+        if self.channels_last:
+            img_batch = img_batch.contiguous(memory_format=torch.channels_last)
+        with torch.no_grad():
+            return self.model(mel_batch, img_batch)
+
+
+class TorchScriptEngine:
+    name = 'torchscript'
+
+    def __init__(self, module, channels_last=False):
+        self.module = module
+        self.channels_last = channels_last
+
+    def __call__(self, mel_batch, img_batch):
+        if self.channels_last:
+            img_batch = img_batch.contiguous(memory_format=torch.channels_last)
+        with torch.no_grad():
+            return self.module(mel_batch, img_batch)
+
+    @classmethod
+    def convert(cls, model, path, device):
+        with torch.no_grad():
+            traced = torch.jit.trace(model, _example_inputs(device))
+            frozen = torch.jit.freeze(traced.eval())
+        torch.jit.save(frozen, path)
+
+
+class OnnxEngine:
+    name = 'onnx'
+
+    def __init__(self, path, device):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError('onnx/int8 engines need onnxruntime: pip install onnxruntime')
+        providers = ['CPUExecutionProvider']
+        if device == 'cuda' and 'CUDAExecutionProvider' in ort.get_available_providers():
+            providers.insert(0, 'CUDAExecutionProvider')
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=providers)
+        self.device = device
+
+    def __call__(self, mel_batch, img_batch):
+        pred, = self.session.run(None, {
+            'mel': mel_batch.detach().cpu().numpy(),
+            'face': img_batch.detach().cpu().numpy(),
+        })
+        return torch.from_numpy(pred).to(self.device)
+
+    @classmethod
+    def convert(cls, model, path, device):
+        kwargs = {}
+        if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+            kwargs['dynamo'] = False
+        with torch.no_grad():
+            torch.onnx.export(model, _example_inputs(device), path,
+                              input_names=['mel', 'face'], output_names=['pred'],
+                              dynamic_axes={'mel': {0: 'batch'}, 'face': {0: 'batch'}, 'pred': {0: 'batch'}},
+                              opset_version=17, **kwargs)
+
+    @classmethod
+    def quantize(cls, onnx_path, path):
+        try:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+        except ImportError:
+            raise RuntimeError('int8 engine needs onnxruntime: pip install onnxruntime')
+        quantize_dynamic(onnx_path, path, weight_type=QuantType.QUInt8)
+
+
+def load_engine(kind, checkpoint, device, channels_last=False):
+    """Build the requested engine for ``checkpoint``, converting and caching it next to the checkpoint."""
+    if kind not in ENGINES:
+        raise ValueError(f'unknown wav2lip engine {kind!r}, expected one of {ENGINES}')
+
+    model = None
+
+    def eager():
+        nonlocal model
+        if model is None:
+            model = build_eager_model(checkpoint, device, channels_last)
+        return model
+
+    if kind == 'eager':
+        return EagerEngine(eager(), channels_last)
+
+    if kind == 'torchscript':
+        path = _artifact(checkpoint, '.cl.ts.pt' if channels_last else '.ts.pt')
+        if _stale(path, checkpoint):
+            print(f'converting {checkpoint} to TorchScript: {path}')
+            _publish(path, lambda tmp_path: TorchScriptEngine.convert(eager(), tmp_path, device))
+        return TorchScriptEngine(torch.jit.load(path, map_location=device), channels_last)
+
+    onnx_path = _artifact(checkpoint, '.onnx')
+    if _stale(onnx_path, checkpoint):
+        print(f'exporting {checkpoint} to ONNX: {onnx_path}')
+        _publish(onnx_path, lambda tmp_path: OnnxEngine.convert(
+            eager().to('cpu', memory_format=torch.contiguous_format), tmp_path, 'cpu'))
+    if kind == 'onnx':
+        return OnnxEngine(onnx_path, device)
+
+    int8_path = _artifact(checkpoint, '.int8.onnx')
+    if _stale(int8_path, onnx_path):
+        print(f'quantizing {onnx_path} to int8: {int8_path}')
+        _publish(int8_path, lambda tmp_path: OnnxEngine.quantize(onnx_path, tmp_path))
+    engine = OnnxEngine(int8_path, device)
+    engine.name = 'int8'
+    return engine
+
+
+def benchmark(checkpoint, engines, device, batch_size=16, iters=10, face_size=FACE_SIZE, channels_last=False):
+    torch.manual_seed(0)
+    mel, img = _example_inputs(device, batch_size, face_size)
+    reference = None
+    results = []
+    for kind in engines:
+        engine = load_engine(kind, checkpoint, device, channels_last)
+        engine(mel, img)  # warm up
+        t = time.perf_counter()
+        for _ in range(iters):
+            pred = engine(mel, img)
+        elapsed = time.perf_counter() - t
+        pred = pred.detach().cpu().numpy()
+        if reference is None:
+            reference = pred if kind == 'eager' else load_engine('eager', checkpoint, device)(mel, img).cpu().numpy()
+        drift = np.abs(pred - reference)
+        results.append((kind, batch_size * iters / elapsed, float(drift.max()), float(drift.mean())))
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark Wav2Lip inference engines')
+    parser.add_argument('--checkpoint', default='./models/wav2lip.pth', type=str)
+    parser.add_argument('--engines', default=','.join(ENGINES), type=str)
+    parser.add_argument('--batch_size', default=16, type=int)
+    parser.add_argument('--iters', default=10, type=int)
+    parser.add_argument('--channels_last', action='store_true')
+    parser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu', type=str)
+    args = parser.parse_args()
+
+    print(f'{"engine":<12}{"fps":>10}{"max drift":>12}{"mean drift":>12}')
+    for kind, fps, max_drift, mean_drift in benchmark(args.checkpoint, args.engines.split(','), args.device,
+                                                      args.batch_size, args.iters, channels_last=args.channels_last):
+        print(f'{kind:<12}{fps:>10.2f}{max_drift:>12.2e}{mean_drift:>12.2e}')
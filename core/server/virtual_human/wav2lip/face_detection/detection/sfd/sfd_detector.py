@@ -14,7 +14,7 @@ models_urls = {
 
 
 class SFDDetector(FaceDetector):
-    def __init__(self, device, path_to_detector=os.path.join(os.path.dirname(os.path.abspath(__file__)), 's3fd.pth'), verbose=False):
+    def __init__(self, device, path_to_detector=os.path.join(os.path.dirname(os.path.abspath(__file__)), 's3fd.pth'), verbose=False, optimize=None):
         super(SFDDetector, self).__init__(device, verbose)
 
         # Initialise the face detector
@@ -27,6 +27,9 @@ class SFDDetector(FaceDetector):
         self.face_detector.load_state_dict(model_weights)
         self.face_detector.to(device)
         self.face_detector.eval()
+        # optional inference pass, e.g. models.optimize_for_inference
+        if optimize is not None:
+            self.face_detector = optimize(self.face_detector)
 
     def detect_from_image(self, tensor_or_path):
         image = self.tensor_or_path_to_ndarray(tensor_or_path)
@@ -7,6 +7,8 @@ from glob import glob
 import torch
 import pickle
 import face_detection
+from avatarpack import write_avatar_pack
+from models import optimize_for_inference
 
 parser = argparse.ArgumentParser(description='Inference code to lip-sync videos in the wild using Wav2Lip models')
 parser.add_argument('--img_size', default=96, type=int)
@@ -20,6 +22,8 @@ parser.add_argument('--pads', nargs='+', type=int, default=[0, 10, 0, 0],
                     help='Padding (top, bottom, left, right). Please adjust to include chin at least')
 parser.add_argument('--face_det_batch_size', type=int, 
                     help='Batch size for face detection', default=8)
+parser.add_argument('--channels_last', default=False, action='store_true',
+                    help='人脸检测网络使用 channels_last 内存布局(GPU 上通常更快，CPU 上可能更慢)')
 args = parser.parse_args()
 
 device = 'cuda' if torch.cuda.is_available() else 'cpu'
@@ -61,7 +65,8 @@ def get_smoothened_boxes(boxes, T):
 
 def face_detect(images):
     detector = face_detection.FaceAlignment(face_detection.LandmarksType._2D, 
-                                            flip_input=False, device=device)
+                                            flip_input=False, device=device,
+                                            optimize=lambda net: optimize_for_inference(net, channels_last=args.channels_last))
 
     batch_size = args.face_det_batch_size
     
@@ -122,13 +127,19 @@ if __name__ == "__main__":
     frames = read_imgs(input_img_list)
     face_det_results = face_detect(frames)
     coord_list = []
+    face_list = []
     idx = 0
     for frame, coords in face_det_results:
         
         resized_crop_frame = cv2.resize(frame, (args.img_size, args.img_size))
         cv2.imwrite(f"{face_imgs_path}/{idx:08d}.png", resized_crop_frame)
         coord_list.append(coords)
+        face_list.append(resized_crop_frame)
         idx += 1
 
     with open(coords_path, 'wb') as f:
         pickle.dump(coord_list, f)
+
+    # 同时生成内存映射的avatar pack，LipReal/推理进程直接映射，无需再逐张读取png
+    pack_path = write_avatar_pack(avatar_path, frames, face_list, coord_list)
+    print(f'avatar pack written to {pack_path}')
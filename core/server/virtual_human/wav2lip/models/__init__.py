@@ -1,2 +1,3 @@
 from .wav2lip_v2 import Wav2Lip, Wav2Lip_disc_qual
-from .syncnet import SyncNet_color
\ No newline at end of file
+from .syncnet import SyncNet_color
+from .optimize import fuse_conv_bn, optimize_for_inference
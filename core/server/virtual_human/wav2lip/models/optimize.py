@@ -0,0 +1,49 @@
+"""Inference-time graph cleanups for the wav2lip networks.
+
+``conv.Conv2d`` / ``conv.Conv2dTranspose`` run a BatchNorm2d right after every
+convolution. In eval mode that BN is a fixed per-channel affine transform, so it
+can be folded into the convolution's weight and bias and the second pass over
+every activation map disappears.
+
+The numerical equivalence check lives in ``core/server/tests/test_optimize.py``.
+"""
+import torch
+from torch import nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+
+def fuse_conv_bn(model):
+    """Fold every ``Conv -> BatchNorm2d`` pair inside an ``nn.Sequential`` into the conv, in place.
+
+    The BN is replaced by ``nn.Identity`` so module names and state-dict keys of the
+    convolutions stay where they were. The model must be in eval mode.
+    """
+    if model.training:
+        raise RuntimeError('fuse_conv_bn needs a model in eval mode')
+    fused = 0
+    for seq in model.modules():
+        if not isinstance(seq, nn.Sequential):
+            continue
+        names = list(seq._modules.keys())
+        for a, b in zip(names, names[1:]):
+            conv, bn = seq._modules[a], seq._modules[b]
+            if not isinstance(bn, nn.BatchNorm2d) or not bn.track_running_stats:
+                continue
+            if isinstance(conv, nn.ConvTranspose2d):
+                seq._modules[a] = fuse_conv_bn_eval(conv, bn, transpose=True)
+            elif isinstance(conv, nn.Conv2d):
+                seq._modules[a] = fuse_conv_bn_eval(conv, bn)
+            else:
+                continue
+            seq._modules[b] = nn.Identity()
+            fused += 1
+    return fused
+
+
+def optimize_for_inference(model, channels_last=False):
+    """Put ``model`` in eval mode, fold its BatchNorms and optionally switch it to channels_last."""
+    model.eval()
+    fuse_conv_bn(model)
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    return model
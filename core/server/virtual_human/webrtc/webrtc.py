@@ -33,11 +33,14 @@ class PlayerStreamTrack(MediaStreamTrack):
     A video track that returns an animated flag.
     """
 
-    def __init__(self, player, kind):
+    def __init__(self, player, kind, metrics=None, epoch=None, on_frame=None):
         super().__init__()  # don't forget this!
         self.kind = kind
         self._player = player
         self._queue = asyncio.Queue()
+        self.metrics = metrics  # StageMetrics，统计帧在队列中的等待时长
+        self.epoch = epoch  # 打断代号(mp.Value)，取帧时丢弃打断前入队的帧
+        self.on_frame = on_frame  # 每送出一帧时以该帧的打断代号回调(计量打断到静音的耗时)
         self.timelist = [] #记录最近包的时间戳
         if self.kind == 'video':
             self.framecount = 0
@@ -87,6 +90,10 @@ class PlayerStreamTrack(MediaStreamTrack):
                 print('audio start:',self._start)
             return self._timestamp, AUDIO_TIME_BASE
 
+    async def put_frame(self, frame, epoch=0):
+        # 连同入队时间和打断代号一起入队，recv 取出时统计在队列里等待的时长
+        await self._queue.put((frame, time.perf_counter(), epoch))
+
     async def recv(self) -> Union[Frame, Packet]:
         # frame = self.frames[self.counter % 30]            
         self._player._start(self)
@@ -106,13 +113,20 @@ class PlayerStreamTrack(MediaStreamTrack):
         #             frame = await self._queue.get()
         #     else:
         #         frame = await self._queue.get()
-        frame = await self._queue.get()
+        while True:
+            frame, enqueued, epoch = await self._queue.get()
+            if self.epoch is None or epoch == self.epoch.value:
+                break
+        if self.metrics is not None:
+            self.metrics.observe('webrtc_' + self.kind, time.perf_counter() - enqueued)
         pts, time_base = await self.next_timestamp()
         frame.pts = pts
         frame.time_base = time_base
         if frame is None:
             self.stop()
             raise Exception
+        if self.on_frame is not None:
+            self.on_frame(epoch)
         if self.kind == 'video':
             self.totaltime += (time.perf_counter() - self.lasttime)
             self.framecount += 1
@@ -151,8 +165,11 @@ class HumanPlayer:
         self.__audio: Optional[PlayerStreamTrack] = None
         self.__video: Optional[PlayerStreamTrack] = None
 
-        self.__audio = PlayerStreamTrack(self, kind="audio")
-        self.__video = PlayerStreamTrack(self, kind="video")
+        metrics = getattr(nerfreal, 'metrics', None)
+        epoch = getattr(nerfreal, 'epoch', None)
+        self.__audio = PlayerStreamTrack(self, kind="audio", metrics=metrics, epoch=epoch,
+                                         on_frame=getattr(nerfreal, 'frame_sent', None))
+        self.__video = PlayerStreamTrack(self, kind="video", metrics=metrics, epoch=epoch)
 
         self.__container = nerfreal
 